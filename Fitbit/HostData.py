@@ -1,32 +1,108 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
-import pandas as pd, requests, os
+from datetime import datetime
+import httpx
 from user_activity import UserActivity
-from config import ACCESS_TOKEN
+from intraday_store import IntradayStore, COLUMNS
+from config import ACCESS_TOKEN, API_BASE
+from profile_cache import profiles, ProfileError
 
-app = FastAPI()
+fitbit = None
+
+@asynccontextmanager
+async def lifespan(app):
+    global fitbit
+    fitbit = httpx.AsyncClient(base_url=API_BASE, timeout=10)
+    yield
+    await fitbit.aclose()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 class Status(BaseModel):
     status: str
     date: str | None = None
     rows: int | None = None
-    data: list | None = None
+    columns: list[str] | None = None
+    data: list | dict | None = None
+    next_cursor: str | None = None
     message: str | None = None
 
+def as_time(value, pad, name):
+    # accepts H:MM, HH:MM or HH:MM:SS and returns HH:MM:SS, the format times are stored in
+    if not value:
+        return None
+    for fmt, out in (("%H:%M:%S", "%H:%M:%S"), ("%H:%M", f"%H:%M:{pad}")):
+        try:
+            return datetime.strptime(value, fmt).strftime(out)
+        except ValueError:
+            continue
+    raise HTTPException(status_code=400, detail=f"{name} must be HH:MM or HH:MM:SS, got {value!r}")
+
+def as_cursor(value):
+    # "YYYY-MM-DD HH:MM:SS" of the last row sent, so later pages stay on the first page's day
+    if not value:
+        return None, None
+    try:
+        moment = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"cursor must be a next_cursor value, got {value!r}")
+    return moment.strftime("%Y-%m-%d"), moment.strftime("%H:%M:%S")
+
+def sync_and_read(date=None, **filters):
+    # later pages read the day the first page synced; syncing again would only burn quota,
+    # and a sync or midnight in between must not move them to another day
+    if date is not None:
+        return date, IntradayStore().read_day(date, **filters)
+    UserActivity().get_user_activity()
+    return IntradayStore().read_latest(**filters)
+
 @app.post("/update-and-send", response_model=Status)
-def update_and_send():
+async def update_and_send(
+    start: str | None = Query(None, description="first minute to return, HH:MM[:SS]"),
+    end: str | None = Query(None, description="last minute to return, HH:MM[:SS]"),
+    columns: str | None = Query(None, description="comma separated metric columns, e.g. heart_rate,steps"),
+    cursor: str | None = Query(None, description="next_cursor from the previous page, YYYY-MM-DD HH:MM:SS"),
+    limit: int | None = Query(None, ge=1, le=1440),
+    fmt: str = Query("records", alias="format", pattern="^(records|columnar)$"),
+):
     try:
-        UserActivity().get_user_activity()
-        df = pd.read_csv("intraday_activity_metrics.csv")
-        if df.empty:
+        selected = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+        unknown = set(selected or []) - set(COLUMNS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(sorted(unknown))}")
+        cursor_date, after = as_cursor(cursor)
+        filters = {"columns": selected, "start": as_time(start, "00", "start"), "end": as_time(end, "59", "end"),
+                   "after": after}
+        # the Fitbit sync and SQLite reads are blocking, keep them off the event loop;
+        # one extra row tells whether another page follows
+        latest_date, latest_data = await run_in_threadpool(
+            sync_and_read, date=cursor_date, limit=limit + 1 if limit else None, **filters
+        )
+        if latest_data.empty:
             raise HTTPException(status_code=204, detail="no data")
-        latest_date = df["date"].max()
-        latest_data = df[df["date"] == latest_date]
+
+        next_cursor = None
+        if limit and len(latest_data) > limit:
+            latest_data = latest_data.iloc[:limit]
+            next_cursor = f"{latest_date} {latest_data['time'].iloc[-1]}"
+        latest_data = latest_data.astype(object).where(latest_data.notna(), None)
+        if fmt == "columnar":
+            # one array per column; the date is already in the envelope
+            latest_data = latest_data.drop(columns="date")
+            data = {col: latest_data[col].tolist() for col in latest_data.columns}
+        else:
+            data = latest_data.to_dict(orient="records")
         return {
             "status": "success",
             "date": latest_date,
             "rows": len(latest_data),
-            "data": latest_data.to_dict(orient="records")
+            "columns": list(latest_data.columns),
+            "data": data,
+            "next_cursor": next_cursor
         }
     except HTTPException as e:
         raise e
@@ -34,10 +110,12 @@ def update_and_send():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/profile")
-def get_user():
-    url = "https://api.fitbit.com/1/user/-/profile.json"
-    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
-    res = requests.get(url, headers=headers)
-    if res.status_code != 200:
-        raise HTTPException(status_code=res.status_code, detail=res.text)
-    return res.json()["user"]
+async def get_user():
+    try:
+        return await profiles.get(fitbit, ACCESS_TOKEN)
+    except ProfileError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@app.get("/profile/cache")
+def profile_cache_stats():
+    return profiles.stats()
@@ -0,0 +1,76 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from fetch_intraday import FetchIntraday
+from intraday_processor import IntradayProcessor
+from rate_limit import TokenBucket
+from config import ACCESS_TOKEN, API_BASE, RATE_LIMIT_PER_HOUR
+
+
+class Backfill:
+    def __init__(self, access_token=ACCESS_TOKEN, api_base=API_BASE, store=None, workers=8,
+                 rate_per_hour=RATE_LIMIT_PER_HOUR, limiter=None):
+        self.workers = workers
+        # every job shares one bucket, so parallelism never exceeds the user's quota
+        self.limiter = limiter or TokenBucket(rate_per_hour / 3600, rate_per_hour)
+        self.client = FetchIntraday(access_token=access_token, api_base=api_base, max_workers=workers, limiter=self.limiter)
+        self.processor = IntradayProcessor(self.client, store)
+        self.store = self.processor.store
+        self.horizon = None
+
+    def jobs(self, start, end, metrics):
+        done = self.store.completed_jobs()
+        day = start
+        while day <= end:
+            ds = day.strftime("%Y-%m-%d")
+            for metric in metrics:
+                if (metric, ds) not in done:
+                    yield metric, ds
+            day += timedelta(days=1)
+
+    def run_job(self, metric, ds):
+        dataset = self.client.fetch_dataset(metric, ds)
+        rows = self.processor.save_dataset(metric, dataset, ds, self.horizon)
+        # a day the device has not synced past is still filling in, so it is never checkpointed as finished
+        if ds < self.horizon.strftime("%Y-%m-%d"):
+            self.store.mark_job_done(metric, ds, rows)
+        return rows
+
+    def run(self, start, end, metrics=None):
+        metrics = metrics or self.processor.metrics
+        pending = list(self.jobs(start, end, metrics))
+        self.horizon = self.processor.sync_horizon()
+        print(f"Backfilling {len(pending)} jobs from {start} to {end}")
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.run_job, metric, ds): (metric, ds) for metric, ds in pending}
+            for i, future in enumerate(as_completed(futures), 1):
+                metric, ds = futures[future]
+                try:
+                    rows = future.result()
+                    print(f"[{i}/{len(pending)}] {metric} {ds}: {rows} rows")
+                except Exception as e:
+                    # one bad day (HTTP error, malformed payload) must not end the run;
+                    # it stays unchecked and is picked up by the next one
+                    failed += 1
+                    print(f"[{i}/{len(pending)}] {metric} {ds} failed: {type(e).__name__}: {e}")
+
+        print(f"Backfill finished: {len(pending) - failed} done, {failed} failed")
+        return failed
+
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill Fitbit intraday history into the intraday store")
+    parser.add_argument("start", type=parse_date)
+    parser.add_argument("end", type=parse_date, nargs="?", default=date.today())
+    parser.add_argument("--metrics", nargs="+")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate-per-hour", type=int, default=RATE_LIMIT_PER_HOUR)
+    args = parser.parse_args()
+
+    Backfill(workers=args.workers, rate_per_hour=args.rate_per_hour).run(args.start, args.end, args.metrics)
@@ -0,0 +1,60 @@
+import argparse, time
+import numpy as np
+import pandas as pd
+from intraday_processor import IntradayProcessor
+from intraday_store import IntradayStore
+
+
+def synthetic_day(rng):
+    data = {}
+    for metric in ["steps", "calories", "distance", "floors", "elevation", "heart"]:
+        # heart rate has gaps when the watch is off the wrist
+        minutes = np.sort(rng.choice(1440, 1200, replace=False)) if metric == "heart" else np.arange(1440)
+        data[metric] = [
+            {"time": f"{m // 60:02d}:{m % 60:02d}:00",
+             "value": int(rng.integers(0, 120)) if metric in ("steps", "floors", "heart") else float(rng.random() * 3)}
+            for m in minutes
+        ]
+    return data
+
+
+def legacy_frame(processor, data, today):
+    # the per-metric outer merge + full-frame dedupe that build_frame replaced
+    combined_df = pd.DataFrame()
+    for metric in processor.metrics:
+        dataset = data.get(metric, [])
+        if dataset:
+            df = pd.DataFrame(dataset).rename(columns={"value": processor.metric_to_column[metric]})
+            if combined_df.empty:
+                combined_df["time"] = df["time"]
+            combined_df = pd.merge(combined_df, df, on="time", how="outer")
+    combined_df["date"] = today
+    combined_df = combined_df.sort_values(by="time")
+    combined_df = combined_df.reindex(columns=["time"] + list(processor.metric_to_column.values()) + ["date"])
+    return combined_df.drop_duplicates(subset=[col for col in combined_df.columns if col != "time"])
+
+
+def timed(fn, days):
+    start = time.perf_counter()
+    for data in days:
+        fn(data)
+    return (time.perf_counter() - start) / len(days) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-user cost of assembling one day of intraday data")
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    days = [synthetic_day(rng) for _ in range(args.users)]
+    processor = IntradayProcessor(client=None, store=IntradayStore(":memory:", legacy_csv=None))
+
+    legacy = timed(lambda data: legacy_frame(processor, data, "2026-01-01"), days)
+    batched = timed(lambda data: processor.build_frame(data, "2026-01-01"), days)
+    frame = processor.build_frame(days[0], "2026-01-01")
+    print(f"users: {args.users}")
+    print(f"merge + drop_duplicates: {legacy:.2f} ms/user")
+    print(f"build_frame:             {batched:.2f} ms/user ({legacy / batched:.1f}x faster)")
+    print(f"frame memory: {legacy_frame(processor, days[0], '2026-01-01').memory_usage(deep=True).sum() / 1024:.0f} KiB"
+          f" -> {frame.memory_usage(deep=True).sum() / 1024:.0f} KiB")
@@ -5,4 +5,11 @@ dotenv_path=pathlib.Path(__file__).with_name('keys.env')
 load_dotenv(dotenv_path)
 
 ACCESS_TOKEN = os.getenv("FITBIT_ACCESS_TOKEN")
-API_BASE = "https://api.fitbit.com"
\ No newline at end of file
+API_BASE = "https://api.fitbit.com"
+FETCH_CONCURRENCY = int(os.getenv("FITBIT_FETCH_CONCURRENCY", "6"))
+FETCH_MAX_RETRIES = int(os.getenv("FITBIT_FETCH_MAX_RETRIES", "3"))
+FETCH_MAX_RETRY_WAIT = float(os.getenv("FITBIT_FETCH_MAX_RETRY_WAIT", "60"))
+RATE_LIMIT_PER_HOUR = int(os.getenv("FITBIT_RATE_LIMIT_PER_HOUR", "150"))
+TOKENS_FILE = os.getenv("FITBIT_TOKENS_FILE", str(pathlib.Path(__file__).with_name("tokens.json")))
+USER_DATA_DIR = os.getenv("FITBIT_USER_DATA_DIR", "users")
+# profile cache TTLs (FITBIT_PROFILE_TTL, FITBIT_PROFILE_STALE_TTL) are read by profile_cache.py
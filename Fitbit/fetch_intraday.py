@@ -1,25 +1,108 @@
-import requests
+import requests, time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from config import ACCESS_TOKEN, API_BASE
+from requests.adapters import HTTPAdapter
+from config import ACCESS_TOKEN, API_BASE, FETCH_CONCURRENCY, FETCH_MAX_RETRIES, FETCH_MAX_RETRY_WAIT
+
+ZONE_NAMES = {"Fat Burn": "fat_burn", "Cardio": "cardio", "Peak": "peak"}
+
+def new_session(pool_size):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def heart_zones(body):
+    # lower bound (bpm) of each of the user's zones, from the day summary that
+    # comes with the heart dataset; {} when the response has none
+    try:
+        zones = body["activities-heart"][0]["value"]["heartRateZones"]
+        found = {ZONE_NAMES[zone["name"]]: zone["min"] for zone in zones if zone["name"] in ZONE_NAMES}
+    except (KeyError, IndexError, TypeError):
+        return {}
+    return found if len(found) == len(ZONE_NAMES) else {}
 
 class FetchIntraday:
-    def __init__(self, access_token=ACCESS_TOKEN, api_base=API_BASE):
+    def __init__(self, access_token=ACCESS_TOKEN, api_base=API_BASE,
+                 max_workers=FETCH_CONCURRENCY, max_retries=FETCH_MAX_RETRIES, limiter=None, session=None):
         self.access_token = access_token
         self.api_base = api_base
         self.headers = {"Authorization": f"Bearer {self.access_token}"}
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.limiter = limiter
+        self.heart_zones = {}
+
+        # one keep-alive session shared by every metric request (and, when
+        # passed in, by every user synced from the same process)
+        self.session = session or new_session(self.max_workers)
 
-    def fetch_intraday_for_metric(self, metric, date):
-        url = f"{self.api_base}/1/user/-/activities/{metric}/date/{date}/1d/1min.json"
+    def _retry_after(self, response, attempt):
+        try:
+            return float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            return float(2 ** attempt)
+
+    def _get(self, url):
+        for attempt in range(self.max_retries + 1):
+            if self.limiter:
+                self.limiter.acquire()
+            response = self.session.get(url, headers=self.headers, timeout=30)
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+            wait = self._retry_after(response, attempt)
+            if self.limiter:
+                # every request sharing the bucket waits, not just this one
+                self.limiter.pause(wait)
+            if wait > FETCH_MAX_RETRY_WAIT:
+                return response
+            print(f"Rate limited on {url}, retrying in {wait:.0f}s")
+            if not self.limiter:
+                time.sleep(wait)
+        return response
+
+    def fetch_dataset(self, metric, date, start_time=None):
+        url = f"{self.api_base}/1/user/-/activities/{metric}/date/{date}/1d/1min"
+        url += f"/time/{start_time[:5]}/23:59.json" if start_time else ".json"
         key = f"activities-{metric}-intraday"
 
-        response = requests.get(url, headers=self.headers)
-        return response.json().get(key, {}).get("dataset", [])
+        response = self._get(url)
+        response.raise_for_status()
+        body = response.json()
+        if metric == "heart":
+            self.heart_zones = heart_zones(body) or self.heart_zones
+        return body.get(key, {}).get("dataset", [])
+
+    def last_sync_time(self):
+        # when the most recently synced device last uploaded; minutes after it
+        # come back zero-filled, so they say nothing yet
+        try:
+            response = self._get(f"{self.api_base}/1/user/-/devices.json")
+            response.raise_for_status()
+            times = [device["lastSyncTime"] for device in response.json() if device.get("lastSyncTime")]
+        except (requests.RequestException, ValueError, TypeError, KeyError) as e:
+            print(f"Failed to fetch device sync time: {e}")
+            return None
+        return datetime.fromisoformat(max(times)[:19]) if times else None
+
+    def fetch_intraday_for_metric(self, metric, date, start_time=None):
+        # None when the request failed, as opposed to [] for a minute range with no data
+        try:
+            return self.fetch_dataset(metric, date, start_time)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Failed to fetch {metric} for {date}: {e}")
+            return None
 
-    def fetch_intraday_metrics(self, metrics):
-        today = datetime.now().strftime("%Y-%m-%d")
-        all_data = {}
+    def fetch_intraday_metrics(self, metrics, since=None, date=None):
+        # since maps metric -> "HH:MM:SS" of the last stored minute; only that
+        # minute onwards is requested so a partially filled minute is refreshed
+        today = date or datetime.now().strftime("%Y-%m-%d")
+        since = since or {}
 
-        for metric in metrics:
-            all_data[metric] = self.fetch_intraday_for_metric(metric, today)
+        workers = min(self.max_workers, len(metrics)) or 1
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda metric: self.fetch_intraday_for_metric(metric, today, since.get(metric)), metrics)
+            all_data = dict(zip(metrics, results))
 
         return all_data, today
@@ -1,8 +1,14 @@
+import numpy as np
+from datetime import datetime, timedelta
 import pandas as pd
-import os
+from intraday_store import IntradayStore
+
+MINUTES_PER_DAY = 1440
+MINUTE_LABELS = np.array([f"{m // 60:02d}:{m % 60:02d}:00" for m in range(MINUTES_PER_DAY)], dtype=object)
+MINUTE_SLOTS = {label: slot for slot, label in enumerate(MINUTE_LABELS)}
 
 class IntradayProcessor:
-    def __init__(self, client):
+    def __init__(self, client, store=None):
         self.metrics = ["steps", "calories", "distance", "floors", "elevation", "heart"]
         self.metric_to_column = {
             "steps": "steps",
@@ -12,37 +18,119 @@ class IntradayProcessor:
             "elevation": "elevation",
             "heart": "heart_rate"
         }
+        self.dtypes = {
+            "steps": "Int32",
+            "calories": "float32",
+            "distance": "float32",
+            "floors": "Int32",
+            "elevation": "float32",
+            "heart_rate": "Int32"
+        }
         self.client = client
+        self.store = store or IntradayStore()
 
-    def process_and_save(self):
-        data, today = self.client.fetch_intraday_metrics(self.metrics)
-        combined_df = pd.DataFrame()
-
-        for metric in self.metrics:
+    def build_frame(self, data, date, metrics=None):
+        # One preallocated minute-of-day slot array per metric, filled in a
+        # single pass, instead of an outer merge per metric.
+        present = np.zeros(MINUTES_PER_DAY, dtype=bool)
+        columns = {}
+        for metric in metrics or self.metrics:
+            column = self.metric_to_column[metric]
+            values = np.full(MINUTES_PER_DAY, np.nan)
             dataset = data.get(metric, [])
             if dataset:
-                df = pd.DataFrame(dataset)
-                df = df.rename(columns={"value": self.metric_to_column[metric]})
-                if combined_df.empty:
-                    combined_df["time"] = df["time"]
-                combined_df = pd.merge(combined_df, df, on="time", how="outer")
+                slots = np.fromiter((MINUTE_SLOTS[point["time"]] for point in dataset), dtype=np.int32, count=len(dataset))
+                values[slots] = np.fromiter((point["value"] for point in dataset), dtype=np.float64, count=len(dataset))
+                present[slots] = True
             else:
                 print(f"No data for {metric}")
+            columns[column] = values
+
+        rows = np.flatnonzero(present)
+        frame = {"time": MINUTE_LABELS[rows]}
+        for column, values in columns.items():
+            frame[column] = pd.array(values[rows], dtype=self.dtypes[column])
+        frame["date"] = np.full(len(rows), date, dtype=object)
+        return pd.DataFrame(frame)
+
+    def sync_horizon(self):
+        # the last minute Fitbit can hold real data for
+        return self.client.last_sync_time() or datetime.now()
 
-        if not combined_df.empty:
-            combined_df["date"] = today
-            combined_df = combined_df.sort_values(by="time")
-            cols = ["time"] + list(self.metric_to_column.values()) + ["date"]
-            combined_df = combined_df[cols]
+    @staticmethod
+    def day_cap(date, horizon):
+        # Fitbit returns the whole day with unsynced minutes zero-filled, so
+        # nothing after the horizon is stored or counted towards the watermark
+        day = horizon.strftime("%Y-%m-%d")
+        if day > date:
+            return MINUTE_LABELS[-1]
+        return horizon.strftime("%H:%M:00") if day == date else None
 
-            path = "intraday_activity_metrics.csv"
-            if os.path.exists(path):
-                existing_df = pd.read_csv(path)
-                combined_df = pd.concat([existing_df, combined_df], ignore_index=True)
+    def _marks(self, data, cap):
+        # data only holds metrics that were fetched; a failed one keeps its old mark and is asked for again
+        if cap == MINUTE_LABELS[-1]:
+            # the device has synced past midnight: the day is complete
+            return {metric: cap for metric in data}
+        return {metric: max(point["time"] for point in dataset) for metric, dataset in data.items() if dataset}
 
-            combined_df = combined_df.drop_duplicates(subset=[col for col in combined_df.columns if col != "time"])
+    def _update_heart_zones(self):
+        # zone minutes use the user's own boundaries once a heart response has carried them
+        zones = getattr(self.client, "heart_zones", None)
+        if zones:
+            self.store.set_heart_zones(zones)
+
+    def save_dataset(self, metric, dataset, date, horizon=None):
+        cap = self.day_cap(date, horizon or datetime.now())
+        if cap is None:
+            return 0
+        self._update_heart_zones()
+        dataset = [point for point in dataset if point["time"] <= cap]
+        saved = self.store.upsert(self.build_frame({metric: dataset}, date, metrics=[metric]))
+        self.store.set_watermarks(date, self._marks({metric: dataset}, cap))
+        return saved
+
+    def sync_day(self, date, horizon):
+        cap = self.day_cap(date, horizon)
+        since = self.store.watermarks(date)
+        if cap is None or all(since.get(metric, "") >= cap for metric in self.metrics):
+            # the device has not uploaded anything past what is stored
+            print(f"No new data for {date}")
+            return 0
+        data, date = self.client.fetch_intraday_metrics(self.metrics, since=since, date=date)
+        failed = [metric for metric in self.metrics if data.get(metric) is None]
+        data = {metric: [point for point in data[metric] if point["time"] <= cap] for metric in self.metrics
+                if metric not in failed}
+        self._update_heart_zones()
+        combined_df = self.build_frame(data, date)
+        saved = self.store.upsert(combined_df)
+        self.store.set_watermarks(date, self._marks(data, cap))
+        if failed:
+            print(f"Fetching {', '.join(failed)} for {date} failed, will retry on the next sync")
+        if combined_df.empty:
+            print(f"No new data for {date}")
+            return 0
+        print(f"Saved {saved} new rows for {date} to {self.store.path}")
+        return saved
+
+    def yesterday_pending(self, yesterday):
+        # yesterday was synced but not to its last minute
+        marks = self.store.watermarks(yesterday)
+        return bool(marks) and min(marks.get(metric, "") for metric in self.metrics) < MINUTE_LABELS[-1]
+
+    def request_cost(self, now=None):
+        # most requests process_and_save can make: the device sync time, one per
+        # metric for today, and as many again while yesterday's tail is unfinished
+        yesterday = ((now or datetime.now()) - timedelta(days=1)).strftime("%Y-%m-%d")
+        return 1 + len(self.metrics) * (2 if self.yesterday_pending(yesterday) else 1)
+
+    def process_and_save(self):
+        now = datetime.now()
+        today = now.strftime("%Y-%m-%d")
+        yesterday = (now - timedelta(days=1)).strftime("%Y-%m-%d")
+        horizon = self.sync_horizon()
 
-            combined_df.to_csv(path, index=False)
-            print(f"Saved {len(combined_df)} rows to {path}")
-        else:
-            print("No data available to save")
\ No newline at end of file
+        # finish the tail of yesterday once the device has uploaded it; sync_day
+        # skips it while the device has not synced since the last stored minute
+        if self.yesterday_pending(yesterday):
+            self.sync_day(yesterday, horizon)
+        return self.sync_day(today, horizon)
@@ -0,0 +1,235 @@
+import json, sqlite3, os
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+
+COLUMNS = ["steps", "calories", "distance", "floors", "elevation", "heart_rate"]
+# counts come back as nullable ints, not floats, even from stores created with REAL columns
+INTEGER_COLUMNS = ["steps", "floors", "heart_rate"]
+DEFAULT_DB = "intraday_activity_metrics.db"
+LEGACY_CSV = "intraday_activity_metrics.csv"
+
+# Daily and rolling summaries, refreshed for every date an upsert touches.
+# A minute is active at >= 100 steps (brisk walking cadence). Heart rate zones
+# are the user's own, as Fitbit reports them with the heart dataset; until it
+# has, they are Fitbit's default fractions of an estimated max heart rate
+# (220 - DEFAULT_AGE). Resting heart rate is the mean of the 30 lowest
+# readings taken in minutes without steps. Rollups end at the last day before
+# today, since today is still filling in.
+ACTIVE_STEPS_PER_MINUTE = 100
+DEFAULT_AGE = 30
+HR_ZONES = {"fat_burn": 0.5, "cardio": 0.7, "peak": 0.85}
+ROLLUP_WINDOWS = [1, 7, 30]
+SUMMARY_COLUMNS = ["steps", "calories", "distance", "floors", "active_minutes", "fat_burn_minutes",
+                   "cardio_minutes", "peak_minutes", "resting_hr", "avg_hr", "max_hr", "minutes"]
+# rollups hold per-day averages over the days with data in each window
+ROLLUP_COLUMNS = ["steps", "calories", "distance", "active_minutes", "fat_burn_minutes",
+                  "cardio_minutes", "peak_minutes", "resting_hr"]
+
+
+def estimated_heart_zones(age=DEFAULT_AGE):
+    # {zone: lower bound in bpm} from the age-predicted max heart rate
+    return {zone: fraction * (220 - age) for zone, fraction in HR_ZONES.items()}
+
+
+class IntradayStore:
+    def __init__(self, path=DEFAULT_DB, legacy_csv=LEGACY_CSV):
+        self.path = path
+        with self._connect() as conn:
+            cols = ", ".join(f"{c} {'INTEGER' if c in INTEGER_COLUMNS else 'REAL'}" for c in COLUMNS)
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS intraday ("
+                f"date TEXT NOT NULL, time TEXT NOT NULL, {cols}, "
+                f"PRIMARY KEY (date, time)) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS backfill_jobs ("
+                "metric TEXT NOT NULL, date TEXT NOT NULL, rows INTEGER, "
+                "PRIMARY KEY (metric, date)) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state ("
+                "metric TEXT NOT NULL, date TEXT NOT NULL, time TEXT NOT NULL, "
+                "PRIMARY KEY (metric, date)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS daily_summary ("
+                f"date TEXT PRIMARY KEY, {', '.join(f'{c} REAL' for c in SUMMARY_COLUMNS)}) WITHOUT ROWID"
+            )
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS rollups ("
+                f"window_days INTEGER PRIMARY KEY, end_date TEXT, days INTEGER, "
+                f"{', '.join(f'{c} REAL' for c in ROLLUP_COLUMNS)})"
+            )
+            empty = conn.execute("SELECT 1 FROM intraday LIMIT 1").fetchone() is None
+            unsummarized = not empty and conn.execute("SELECT 1 FROM daily_summary LIMIT 1").fetchone() is None
+        if empty and legacy_csv and os.path.exists(legacy_csv):
+            print(f"Migrating {legacy_csv} into {path}")
+            self.migrate_csv(legacy_csv)
+        elif unsummarized:
+            print(f"Summarizing existing intraday data in {path}")
+            self.refresh_summaries()
+
+    @classmethod
+    def for_user(cls, user_id, data_dir):
+        os.makedirs(data_dir, exist_ok=True)
+        return cls(os.path.join(data_dir, f"{user_id}.db"), legacy_csv=None)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def upsert(self, df):
+        # Only the (date, time) rows present in df are written; columns missing
+        # from df or NaN in it keep whatever value is already stored.
+        if df.empty:
+            return 0
+        cols = [c for c in COLUMNS if c in df.columns]
+        names = ", ".join(["date", "time"] + cols)
+        marks = ", ".join("?" * (len(cols) + 2))
+        updates = ", ".join(f"{c}=COALESCE(excluded.{c}, {c})" for c in cols)
+        sql = f"INSERT INTO intraday ({names}) VALUES ({marks}) ON CONFLICT(date, time) DO "
+        sql += f"UPDATE SET {updates}" if cols else "NOTHING"
+        frame = df[["date", "time"] + cols]
+        # float32 columns are widened without picking up binary noise (1.1 -> 1.100000023)
+        frame = frame.astype({c: "float64" for c in cols if frame[c].dtype == "float32"}).round(6).astype(object)
+        rows = frame.where(frame.notna(), None).itertuples(index=False, name=None)
+        with self._connect() as conn:
+            conn.executemany(sql, rows)
+            self._summarize(conn, df["date"].unique().tolist())
+        return len(df)
+
+    def _heart_zones(self, conn):
+        row = conn.execute("SELECT value FROM settings WHERE key = 'heart_zones'").fetchone()
+        return json.loads(row[0]) if row else estimated_heart_zones()
+
+    def heart_zones(self):
+        with self._connect() as conn:
+            return self._heart_zones(conn)
+
+    def set_heart_zones(self, zones):
+        # zones change with age, rarely; every stored day is re-summarized when they do
+        with self._connect() as conn:
+            if self._heart_zones(conn) == zones:
+                return False
+            conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('heart_zones', ?)", (json.dumps(zones),))
+            self._summarize(conn, [row[0] for row in conn.execute("SELECT DISTINCT date FROM intraday")])
+        return True
+
+    def _summarize(self, conn, dates, today=None):
+        bounds = self._heart_zones(conn)
+        zone = lambda low, high=None: (f"SUM(heart_rate >= {bounds[low]:g}"
+                                       + (f" AND heart_rate < {bounds[high]:g})" if high else ")"))
+        conn.executemany(
+            f"INSERT OR REPLACE INTO daily_summary (date, {', '.join(SUMMARY_COLUMNS)}) "
+            f"SELECT date, SUM(steps), ROUND(SUM(calories), 3), ROUND(SUM(distance), 3), SUM(floors), "
+            f"SUM(steps >= {ACTIVE_STEPS_PER_MINUTE}), "
+            f"{zone('fat_burn', 'cardio')}, {zone('cardio', 'peak')}, {zone('peak')}, "
+            f"(SELECT ROUND(AVG(heart_rate), 1) FROM (SELECT heart_rate FROM intraday WHERE date = ?1 "
+            f"AND heart_rate > 0 AND COALESCE(steps, 0) = 0 ORDER BY heart_rate LIMIT 30)), "
+            f"ROUND(AVG(heart_rate), 1), MAX(heart_rate), COUNT(*) "
+            f"FROM intraday WHERE date = ?1 GROUP BY date",
+            [(date,) for date in dates]
+        )
+        today = today or datetime.now().strftime("%Y-%m-%d")
+        end = conn.execute("SELECT MAX(date) FROM daily_summary WHERE date < ?", (today,)).fetchone()[0]
+        if end is None:
+            return
+        averages = ", ".join(f"ROUND(AVG({c}), 1)" for c in ROLLUP_COLUMNS)
+        conn.executemany(
+            f"INSERT OR REPLACE INTO rollups (window_days, end_date, days, {', '.join(ROLLUP_COLUMNS)}) "
+            f"SELECT ?1, ?2, COUNT(*), {averages} FROM daily_summary "
+            f"WHERE date > date(?2, '-' || ?1 || ' days') AND date <= ?2",
+            [(window, end) for window in ROLLUP_WINDOWS]
+        )
+
+    def refresh_summaries(self, dates=None):
+        # recompute daily summaries (all dates by default) and the rollups
+        with self._connect() as conn:
+            if dates is None:
+                dates = [row[0] for row in conn.execute("SELECT DISTINCT date FROM intraday")]
+            self._summarize(conn, dates)
+        return len(dates)
+
+    def rollups(self):
+        # {window_days: {end_date, days, per-day averages}}
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute("SELECT * FROM rollups ORDER BY window_days").fetchall()
+        return {row["window_days"]: dict(row) for row in rows}
+
+    def latest_date(self):
+        with self._connect() as conn:
+            row = conn.execute("SELECT MAX(date) FROM intraday").fetchone()
+        return row[0]
+
+    def read_day(self, date, columns=None, start=None, end=None, after=None, limit=None):
+        columns = columns or COLUMNS
+        unknown = set(columns) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+
+        sql = f"SELECT time, {', '.join(columns)}, date FROM intraday WHERE date = ?"
+        params = [date]
+        for clause, value in (("time >= ?", start), ("time <= ?", end), ("time > ?", after)):
+            if value:
+                sql += f" AND {clause}"
+                params.append(value)
+        sql += " ORDER BY time"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._connect() as conn:
+            frame = pd.read_sql_query(sql, conn, params=params)
+        return frame.astype({c: "Int32" for c in columns if c in INTEGER_COLUMNS})
+
+    def read_latest(self, **filters):
+        date = self.latest_date()
+        if date is None:
+            return None, pd.DataFrame(columns=["time"] + (filters.get("columns") or COLUMNS) + ["date"])
+        return date, self.read_day(date, **filters)
+
+    def watermarks(self, date):
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT metric, time FROM sync_state WHERE date = ?", (date,)).fetchall())
+
+    def set_watermarks(self, date, marks):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO sync_state (metric, date, time) VALUES (?, ?, ?) "
+                "ON CONFLICT(metric, date) DO UPDATE SET time = MAX(time, excluded.time)",
+                [(metric, date, time) for metric, time in marks.items()]
+            )
+
+    def completed_jobs(self):
+        with self._connect() as conn:
+            return set(conn.execute("SELECT metric, date FROM backfill_jobs").fetchall())
+
+    def mark_job_done(self, metric, date, rows):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO backfill_jobs (metric, date, rows) VALUES (?, ?, ?)",
+                (metric, date, rows)
+            )
+
+    def migrate_csv(self, csv_path=LEGACY_CSV, chunksize=50000):
+        if not os.path.exists(csv_path):
+            return 0
+        total = 0
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            total += self.upsert(chunk.drop_duplicates(subset=["date", "time"], keep="last"))
+        return total
+
+
+if __name__ == "__main__":
+    store = IntradayStore()
+    migrated = store.migrate_csv()
+    print(f"Migrated {migrated} rows from {LEGACY_CSV} to {store.path}")
@@ -0,0 +1,70 @@
+import argparse, json, re, tempfile, threading, time
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+from sync_scheduler import SyncScheduler
+from token_registry import TokenRegistry
+
+
+class StubFitbit(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.05
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.endswith("/devices.json"):
+            # the device uploaded just now, so minutes up to now hold real data
+            return self.reply([{"id": "1", "lastSyncTime": datetime.now().strftime("%Y-%m-%dT%H:%M:%S.000")}])
+        match = re.search(r"activities/([\w-]+)/date/[\d-]+/1d/1min(?:/time/(\d\d):(\d\d))?", self.path)
+        if not match:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        time.sleep(self.latency)
+        metric = match.group(1)
+        first = int(match.group(2) or 0) * 60 + int(match.group(3) or 0)
+        # the whole rest of the day, like Fitbit, which zero-fills unsynced minutes
+        dataset = [{"time": f"{m // 60:02d}:{m % 60:02d}:00", "value": m % 50} for m in range(first, 1440)]
+        self.reply({f"activities-{metric}-intraday": {"dataset": dataset}})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run sync rounds for many users against a local stub Fitbit API")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub response delay in seconds")
+    args = parser.parse_args()
+
+    StubFitbit.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubFitbit)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = TokenRegistry(f"{tmp}/tokens.json")
+        for i in range(args.users):
+            registry.register(f"user{i}", f"token{i}")
+        scheduler = SyncScheduler(registry, workers=args.workers, data_dir=f"{tmp}/users",
+                                  api_base=f"http://127.0.0.1:{server.server_port}")
+
+        for round_no in range(1, args.rounds + 1):
+            start = time.perf_counter()
+            stats = scheduler.run_once()
+            elapsed = time.perf_counter() - start
+            durations = np.array(stats["durations"]) * 1000
+            print(f"round {round_no}: {stats['synced']} synced, {stats['failed']} failed, "
+                  f"{stats['deferred']} deferred in {elapsed:.1f}s ({stats['synced'] / elapsed:.0f} users/s), "
+                  f"per-user p50 {np.percentile(durations, 50):.0f} ms, p95 {np.percentile(durations, 95):.0f} ms")
+    server.shutdown()
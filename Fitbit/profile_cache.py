@@ -0,0 +1,202 @@
+import asyncio, hashlib, os, threading, time
+
+# Fitbit profiles per (user, token), shared by every caller in the process.
+# Used by this service and by longivity-llm/model (which puts this directory on
+# its path), so it reads its settings from the environment rather than from
+# either service's config module.
+#
+#   fresh   (age < ttl)              served from memory
+#   stale   (age < ttl + stale_ttl)  served from memory, refreshed in the background
+#   expired                          fetched; concurrent callers share one request
+#
+# Refreshes send If-None-Match when Fitbit gave an ETag. On 429 / 5xx / network
+# errors the last profile keeps being served and nothing is re-requested until
+# Retry-After has passed, so a slow or rate-limiting Fitbit never fans out.
+PROFILE_PATH = "/1/user/{user}/profile.json"
+DEFAULT_RETRY_AFTER = 60
+API_BASE = "https://api.fitbit.com"
+# profiles are served from memory for PROFILE_TTL seconds, then for up to
+# PROFILE_STALE_TTL more while refreshed in the background (0 disables)
+PROFILE_TTL = float(os.getenv("FITBIT_PROFILE_TTL", "3600"))
+PROFILE_STALE_TTL = float(os.getenv("FITBIT_PROFILE_STALE_TTL", "86400"))
+
+
+class ProfileError(Exception):
+    def __init__(self, status_code, detail):
+        super().__init__(f"Fitbit profile request failed: {status_code} {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class ProfileCache:
+    def __init__(self, ttl=PROFILE_TTL, stale_ttl=PROFILE_STALE_TTL, api_base=API_BASE):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.api_base = api_base
+        self.entries = {}       # key -> {"profile", "etag", "fetched", "retry_at"}
+        self.backoff = {}       # key -> (retry_at, status), for keys that failed with nothing cached
+        self.inflight = {}      # key -> asyncio.Task (async callers)
+        self.refreshing = set() # keys being refreshed by a thread (sync callers)
+        # sync callers run on worker threads next to the event loop, so every
+        # read-modify-write of entries, backoff and counts happens under this lock
+        self.lock = threading.RLock()
+        self.key_locks = {}
+        self.counts = {"hits": 0, "stale_hits": 0, "misses": 0, "fetches": 0, "not_modified": 0, "errors": 0}
+
+    @staticmethod
+    def key(token, user="-"):
+        # keyed on a digest so tokens never show up in keys or debug dumps
+        return user, hashlib.sha256((token or "").encode()).hexdigest()[:16]
+
+    def _state(self, entry, now):
+        if entry is None:
+            return "expired"
+        age = now - entry["fetched"]
+        if age < self.ttl:
+            return "fresh"
+        if age < self.ttl + self.stale_ttl or now < entry["retry_at"]:
+            return "stale"
+        return "expired"
+
+    def _request(self, key, token, user):
+        headers = {"Authorization": f"Bearer {token}"}
+        with self.lock:
+            self.counts["fetches"] += 1
+            entry = self.entries.get(key)
+            if entry and entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+        return PROFILE_PATH.format(user=user), headers
+
+    def _handle(self, key, status_code, headers, res):
+        now = time.time()
+        if status_code == 200:
+            profile = res.json()["user"]
+            with self.lock:
+                self.entries[key] = {"profile": profile, "etag": headers.get("ETag"), "fetched": now, "retry_at": 0}
+                self.backoff.pop(key, None)
+            return profile
+        with self.lock:
+            entry = self.entries.get(key)
+            if status_code == 304 and entry:
+                self.counts["not_modified"] += 1
+                entry["fetched"] = now
+                return entry["profile"]
+        if status_code == 429 or status_code >= 500:
+            try:
+                wait = float(headers.get("Retry-After", DEFAULT_RETRY_AFTER))
+            except ValueError:
+                wait = DEFAULT_RETRY_AFTER
+            return self._failed(key, status_code, res.text, now + wait)
+        # 401 / 403: the token is no longer good for this user
+        with self.lock:
+            self.entries.pop(key, None)
+        raise ProfileError(status_code, res.text)
+
+    def _failed(self, key, status_code, detail, retry_at):
+        with self.lock:
+            self.counts["errors"] += 1
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry["retry_at"] = retry_at
+                return entry["profile"]
+            self.backoff[key] = (retry_at, status_code)
+        raise ProfileError(status_code, detail)
+
+    def _lookup(self, key):
+        # -> (cached profile or None, whether a fetch should start)
+        with self.lock:
+            entry = self.entries.get(key)
+            now = time.time()
+            state = self._state(entry, now)
+            if state == "fresh":
+                self.counts["hits"] += 1
+                return entry["profile"], False
+            if state == "stale":
+                self.counts["stale_hits"] += 1
+                return entry["profile"], now >= entry["retry_at"]
+            self.counts["misses"] += 1
+            retry_at, status_code = self.backoff.get(key, (0, None))
+        if now < retry_at:
+            raise ProfileError(status_code, f"Fitbit unavailable, retrying in {retry_at - now:.0f}s")
+        return None, True
+
+    # ---------- async (httpx.AsyncClient with base_url=API_BASE) ----------
+
+    async def get(self, client, token, user="-"):
+        key = self.key(token, user)
+        profile, refresh = self._lookup(key)
+        if refresh and key not in self.inflight:
+            task = asyncio.create_task(self._fetch(client, key, token, user))
+            self.inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        if profile is not None:
+            return profile
+        return await asyncio.shield(self.inflight[key])
+
+    async def _fetch(self, client, key, token, user):
+        path, headers = self._request(key, token, user)
+        try:
+            res = await client.get(path, headers=headers)
+        except Exception as e:
+            return self._failed(key, 503, str(e), time.time() + DEFAULT_RETRY_AFTER)
+        return self._handle(key, res.status_code, res.headers, res)
+
+    def _done(self, key, task):
+        self.inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()   # background refresh failures are already counted
+
+    # ---------- sync (requests.Session or the requests module) ----------
+
+    def get_sync(self, session, token, user="-", timeout=10):
+        key = self.key(token, user)
+        profile, refresh = self._lookup(key)
+        if profile is not None:
+            if refresh:
+                with self.lock:
+                    start = key not in self.refreshing
+                    self.refreshing.add(key)
+                if start:
+                    threading.Thread(target=self._refresh_sync, args=(session, key, token, user, timeout), daemon=True).start()
+            return profile
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # another thread may have fetched it while this one waited
+            with self.lock:
+                entry = self.entries.get(key)
+                if self._state(entry, time.time()) == "fresh":
+                    return entry["profile"]
+            return self._fetch_sync(session, key, token, user, timeout)
+
+    def _fetch_sync(self, session, key, token, user, timeout):
+        path, headers = self._request(key, token, user)
+        try:
+            res = session.get(self.api_base + path, headers=headers, timeout=timeout)
+        except Exception as e:
+            return self._failed(key, 503, str(e), time.time() + DEFAULT_RETRY_AFTER)
+        return self._handle(key, res.status_code, res.headers, res)
+
+    def _refresh_sync(self, session, key, token, user, timeout):
+        try:
+            self._fetch_sync(session, key, token, user, timeout)
+        except ProfileError:
+            pass
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def invalidate(self, token=None, user="-"):
+        with self.lock:
+            if token is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(self.key(token, user), None)
+
+    def stats(self):
+        with self.lock:
+            return {**self.counts, "entries": len(self.entries), "ttl": self.ttl, "stale_ttl": self.stale_ttl}
+
+
+# one cache per process
+profiles = ProfileCache()
@@ -0,0 +1,50 @@
+import threading, time
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        # rate is in tokens per second
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        if now < self.paused_until:
+            # the API said to back off: nothing is handed out until then
+            self.tokens, self.updated = 0, now
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - max(self.updated, self.paused_until)) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds):
+        # drain the bucket and stop every caller for `seconds`, e.g. a 429's Retry-After
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens, self.updated = 0, time.monotonic()
+
+    def available(self):
+        with self.lock:
+            self._refill()
+            return self.tokens
+
+    def try_acquire(self, tokens=1):
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = max(self.paused_until - time.monotonic(), 0) + (tokens - self.tokens) / self.rate
+            time.sleep(wait)
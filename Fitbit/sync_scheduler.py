@@ -0,0 +1,100 @@
+import argparse, threading, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from fetch_intraday import new_session
+from intraday_processor import IntradayProcessor
+from intraday_store import IntradayStore
+from rate_limit import TokenBucket
+from token_registry import TokenRegistry
+from user_activity import UserActivity
+from config import API_BASE, FETCH_CONCURRENCY, RATE_LIMIT_PER_HOUR, USER_DATA_DIR
+
+
+class SyncScheduler:
+    def __init__(self, registry=None, workers=16, rate_per_hour=RATE_LIMIT_PER_HOUR,
+                 data_dir=USER_DATA_DIR, api_base=API_BASE, fetch_concurrency=FETCH_CONCURRENCY):
+        self.registry = registry or TokenRegistry()
+        self.workers = workers
+        self.rate_per_hour = rate_per_hour
+        self.data_dir = data_dir
+        self.api_base = api_base
+        self.fetch_concurrency = fetch_concurrency
+        self.session = new_session(workers * fetch_concurrency)
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def limiter(self, user_id):
+        # Fitbit enforces its quota per user token, so each user gets a bucket
+        with self.lock:
+            if user_id not in self.limiters:
+                self.limiters[user_id] = TokenBucket(self.rate_per_hour / 3600, self.rate_per_hour)
+            return self.limiters[user_id]
+
+    def sync_cost(self, user_id):
+        # requests the next sync may need, from the user's stored watermarks
+        return IntradayProcessor(None, IntradayStore.for_user(user_id, self.data_dir)).request_cost()
+
+    def sync_user(self, user_id):
+        activity = UserActivity(
+            access_token=self.registry.get(user_id),
+            store=IntradayStore.for_user(user_id, self.data_dir),
+            api_base=self.api_base,
+            max_workers=self.fetch_concurrency,
+            limiter=self.limiter(user_id),
+            session=self.session,
+        )
+        start = time.perf_counter()
+        activity.get_user_activity()
+        return time.perf_counter() - start
+
+    def run_once(self):
+        # Round-robin: every user is offered exactly one sync per round and a
+        # user without quota left is deferred to the next round rather than
+        # parking a worker on its rate limiter.
+        queue = deque(self.registry.users())
+        stats = {"synced": 0, "failed": 0, "deferred": 0, "durations": []}
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while queue or running:
+                while queue and len(running) < self.workers:
+                    user_id = queue.popleft()
+                    if self.limiter(user_id).available() < self.sync_cost(user_id):
+                        stats["deferred"] += 1
+                        continue
+                    running[pool.submit(self.sync_user, user_id)] = user_id
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    user_id = running.pop(future)
+                    try:
+                        stats["durations"].append(future.result())
+                        stats["synced"] += 1
+                    except Exception as e:
+                        stats["failed"] += 1
+                        print(f"Sync failed for {user_id}: {e}")
+        return stats
+
+    def run_forever(self, interval=900):
+        while True:
+            start = time.monotonic()
+            report(self.run_once())
+            time.sleep(max(0, interval - (time.monotonic() - start)))
+
+
+def report(stats):
+    print(f"Round done: {stats['synced']} synced, {stats['failed']} failed, {stats['deferred']} deferred")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync intraday data for every registered Fitbit user")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--interval", type=int, default=900, help="seconds between rounds")
+    parser.add_argument("--once", action="store_true")
+    args = parser.parse_args()
+
+    scheduler = SyncScheduler(workers=args.workers)
+    if args.once:
+        report(scheduler.run_once())
+    else:
+        scheduler.run_forever(args.interval)
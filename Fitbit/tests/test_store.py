@@ -0,0 +1,28 @@
+import sqlite3
+import pandas as pd
+from intraday_store import IntradayStore
+
+
+def test_counts_are_read_back_as_ints(tmp_path):
+    store = IntradayStore(str(tmp_path / "intraday.db"), legacy_csv=None)
+    store.upsert(pd.DataFrame({"date": ["2024-01-01"] * 2, "time": ["10:00:00", "10:01:00"],
+                               "steps": pd.array([12, None], dtype="Int32"), "heart_rate": pd.array([72, 75], dtype="Int32"),
+                               "calories": [1.25, 1.5]}))
+    day = store.read_day("2024-01-01")
+    assert str(day["steps"].dtype) == "Int32" and str(day["heart_rate"].dtype) == "Int32"
+    assert day["heart_rate"].tolist() == [72, 75]
+    assert day["steps"].isna().tolist() == [False, True]
+    assert day["calories"].tolist() == [1.25, 1.5]
+
+
+def test_stores_created_with_real_columns_still_read_ints(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE intraday (date TEXT NOT NULL, time TEXT NOT NULL, steps REAL, calories REAL, distance REAL, "
+                 "floors REAL, elevation REAL, heart_rate REAL, PRIMARY KEY (date, time)) WITHOUT ROWID")
+    conn.execute("INSERT INTO intraday (date, time, steps, heart_rate) VALUES ('2024-01-01', '10:00:00', 12, NULL)")
+    conn.commit()
+    conn.close()
+    day = IntradayStore(path, legacy_csv=None).read_day("2024-01-01", columns=["steps", "heart_rate"])
+    assert day["steps"].tolist() == [12]
+    assert str(day["heart_rate"].dtype) == "Int32"
@@ -0,0 +1,172 @@
+import time
+from datetime import datetime, timedelta
+import pytest, requests
+from backfill import Backfill
+from fetch_intraday import FetchIntraday
+from intraday_processor import IntradayProcessor, MINUTE_LABELS
+from intraday_store import IntradayStore
+from rate_limit import TokenBucket
+
+METRICS = ["steps", "calories", "distance", "floors", "elevation", "heart"]
+
+
+class Response:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body or {}
+        self.headers = headers or {}
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code}")
+
+
+class Session:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        return self.responses.pop(0)
+
+
+def full_day(value=1):
+    # Fitbit answers with every minute of the day, unsynced ones zero-filled
+    return [{"time": t, "value": value} for t in MINUTE_LABELS]
+
+
+class Client:
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = set(failing)
+
+    def fetch_intraday_metrics(self, metrics, since=None, date=None):
+        # a failed metric comes back as None, like FetchIntraday.fetch_intraday_for_metric
+        self.calls.append(dict(since or {}))
+        return {metric: None if metric in self.failing else
+                [p for p in full_day() if p["time"] >= (since or {}).get(metric, "")] for metric in metrics}, date
+
+
+@pytest.fixture
+def store(tmp_path):
+    return IntradayStore(str(tmp_path / "intraday.db"), legacy_csv=None)
+
+
+def test_429_waits_out_retry_after_on_the_shared_bucket():
+    session = Session([Response(429, headers={"Retry-After": "0.2"}), Response(200)])
+    limiter = TokenBucket(100, 10)
+    client = FetchIntraday(access_token="t", api_base="http://fitbit", limiter=limiter, session=session)
+    start = time.monotonic()
+    assert client._get("http://fitbit/x").status_code == 200
+    assert time.monotonic() - start >= 0.2
+    assert len(session.urls) == 2
+
+
+def test_429_backs_off_exponentially_without_retry_after(monkeypatch):
+    waits = []
+    monkeypatch.setattr(time, "sleep", waits.append)
+    session = Session([Response(429), Response(429), Response(200)])
+    client = FetchIntraday(access_token="t", api_base="http://fitbit", session=session)
+    assert client._get("http://fitbit/x").status_code == 200
+    assert waits == [1.0, 2.0]
+
+
+def test_long_retry_after_gives_up_and_pauses_everyone():
+    session = Session([Response(429, headers={"Retry-After": "3600"})])
+    limiter = TokenBucket(100, 10)
+    client = FetchIntraday(access_token="t", api_base="http://fitbit", limiter=limiter, session=session)
+    assert client._get("http://fitbit/x").status_code == 429
+    assert not limiter.try_acquire()
+    assert limiter.available() == 0
+
+
+def test_watermark_advances_to_the_device_sync_not_end_of_day(store):
+    client = Client()
+    processor = IntradayProcessor(client, store)
+    today = datetime.now().strftime("%Y-%m-%d")
+    horizon = datetime.strptime(f"{today} 10:30:15", "%Y-%m-%d %H:%M:%S")
+
+    assert processor.sync_day(today, horizon) == 631
+    assert set(store.watermarks(today).values()) == {"10:30:00"}
+    assert store.read_day(today)["time"].max() == "10:30:00"
+
+    # nothing new on the device: no request at all
+    assert processor.sync_day(today, horizon) == 0
+    assert len(client.calls) == 1
+
+    # the next sync asks only from the stored watermark on
+    processor.sync_day(today, horizon + timedelta(hours=1))
+    assert client.calls[-1] == {metric: "10:30:00" for metric in METRICS}
+    assert set(store.watermarks(today).values()) == {"11:30:00"}
+
+
+def test_day_is_complete_once_the_device_synced_past_midnight(store):
+    client = Client()
+    processor = IntradayProcessor(client, store)
+    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    assert processor.sync_day(yesterday, datetime.now()) == 1440
+    assert set(store.watermarks(yesterday).values()) == {"23:59:00"}
+    assert processor.sync_day(yesterday, datetime.now()) == 0
+    assert len(client.calls) == 1
+
+
+def test_failed_metric_is_not_marked_complete(store):
+    client = Client(failing={"heart"})
+    processor = IntradayProcessor(client, store)
+    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    processor.sync_day(yesterday, datetime.now())
+    marks = store.watermarks(yesterday)
+    assert "heart" not in marks
+    assert set(marks.values()) == {"23:59:00"}
+
+    # the next sync asks again and fills heart rate in
+    client.failing.clear()
+    assert processor.sync_day(yesterday, datetime.now()) == 1440
+    assert store.read_day(yesterday)["heart_rate"].notna().sum() == 1440
+    assert store.watermarks(yesterday)["heart"] == "23:59:00"
+
+
+def test_sync_cost_covers_an_unfinished_yesterday(store):
+    processor = IntradayProcessor(None, store)
+    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    assert processor.request_cost() == 7
+    store.set_watermarks(yesterday, {metric: "22:00:00" for metric in METRICS})
+    assert processor.request_cost() == 13
+    store.set_watermarks(yesterday, {metric: "23:59:00" for metric in METRICS})
+    assert processor.request_cost() == 7
+
+
+def test_fetch_failure_is_told_apart_from_no_data():
+    session = Session([Response(429, headers={"Retry-After": "3600"}), Response(200, {"activities-heart-intraday": {"dataset": []}})])
+    client = FetchIntraday(access_token="t", api_base="http://fitbit", session=session)
+    assert client.fetch_intraday_for_metric("heart", "2024-01-01") is None
+    assert client.fetch_intraday_for_metric("heart", "2024-01-01") == []
+
+
+def test_backfill_survives_bad_jobs_and_resumes_only_those(store, monkeypatch):
+    backfill = Backfill(access_token="t", api_base="http://fitbit", store=store, workers=2, limiter=TokenBucket(1000, 100))
+    monkeypatch.setattr(backfill.client, "last_sync_time", datetime.now)
+    fetched = []
+
+    def fetch_dataset(metric, date, start_time=None):
+        fetched.append((metric, date))
+        if (metric, date) == ("heart", "2024-01-02"):
+            raise KeyError("activities-heart-intraday")
+        return full_day()
+
+    monkeypatch.setattr(backfill.client, "fetch_dataset", fetch_dataset)
+    start, end = datetime(2024, 1, 1).date(), datetime(2024, 1, 3).date()
+    assert backfill.run(start, end, ["steps", "heart"]) == 1
+    assert len(fetched) == 6
+    assert ("heart", "2024-01-02") not in store.completed_jobs()
+
+    # an interrupted or partly failed run picks up only what is left
+    fetched.clear()
+    monkeypatch.setattr(backfill.client, "fetch_dataset", lambda metric, date, start_time=None: fetched.append((metric, date)) or full_day())
+    assert backfill.run(start, end, ["steps", "heart"]) == 0
+    assert fetched == [("heart", "2024-01-02")]
+    assert len(store.completed_jobs()) == 6
@@ -0,0 +1,39 @@
+import json, os, threading
+from config import ACCESS_TOKEN, TOKENS_FILE
+
+
+class TokenRegistry:
+    def __init__(self, path=TOKENS_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.tokens = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.tokens = json.load(f)
+        elif ACCESS_TOKEN:
+            # single-user installs keep working off keys.env
+            self.tokens = {"default": ACCESS_TOKEN}
+
+    def users(self):
+        with self.lock:
+            return list(self.tokens)
+
+    def get(self, user_id):
+        with self.lock:
+            return self.tokens[user_id]
+
+    def register(self, user_id, access_token):
+        with self.lock:
+            self.tokens[user_id] = access_token
+            self._save()
+
+    def remove(self, user_id):
+        with self.lock:
+            self.tokens.pop(user_id, None)
+            self._save()
+
+    def _save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.tokens, f, indent=2)
+        os.replace(tmp, self.path)
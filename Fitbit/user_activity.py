@@ -1,24 +1,25 @@
 from intraday_processor import IntradayProcessor
 from fetch_intraday import FetchIntraday
 from config import ACCESS_TOKEN
+from profile_cache import profiles
 import requests
 
 
 class UserActivity:
+    def __init__(self, access_token=ACCESS_TOKEN, store=None, **client_options):
+        self.access_token = access_token
+        self.store = store
+        self.client_options = client_options
+
     def get_user_activity(self):
-        client = FetchIntraday()
-        processor = IntradayProcessor(client)
-        processor.process_and_save()
+        client = FetchIntraday(access_token=self.access_token, **self.client_options)
+        processor = IntradayProcessor(client, self.store)
+        return processor.process_and_save()
     def get_user(self):
-        profile_url = "https://api.fitbit.com/1/user/-/profile.json"
-        headers = {
-            "Authorization": f"Bearer {ACCESS_TOKEN}"
-        }
-
-        res = requests.get(profile_url, headers=headers)
-        print(res.json())
-        if res.status_code != 200:
-            raise Exception(f"Failed to fetch Fitbit profile: {res.status_code}, {res.text}")
+        # served from the process-wide profile cache; raises ProfileError on failure
+        profile = profiles.get_sync(requests, self.access_token)
+        print(profile)
+        return profile
 
 if __name__ == "__main__":
     activity = UserActivity()
@@ -0,0 +1,59 @@
+import faiss
+from config import IVF_NLIST, PQ_M, HNSW_M, NPROBE, EF_SEARCH
+
+INDEX_TYPES = ["flat", "ivf_flat", "ivf_pq", "hnsw"]
+
+
+def factory_string(kind, nlist=IVF_NLIST, pq_m=PQ_M, hnsw_m=HNSW_M):
+    # IVF indexes keep their own ids; flat and HNSW need an IDMap2 so vector
+    # ids can be chunk store ids
+    if kind == "flat":
+        return "IDMap2,Flat"
+    if kind == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if kind == "ivf_pq":
+        return f"IVF{nlist},PQ{pq_m}"
+    if kind == "hnsw":
+        return f"IDMap2,HNSW{hnsw_m},Flat"
+    raise ValueError(f"Unknown index type {kind!r}, expected one of {', '.join(INDEX_TYPES)}")
+
+
+def new_index(dim, kind="flat", **options):
+    return faiss.index_factory(dim, factory_string(kind, **options), faiss.METRIC_INNER_PRODUCT)
+
+
+def min_train_size(index, recommended=True):
+    # k-means wants ~39 points per centroid; below one per centroid it fails
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        return 0
+    per_centroid = 39 if recommended else 1
+    size = ivf.nlist * per_centroid
+    ivf = faiss.downcast_index(ivf)
+    if isinstance(ivf, faiss.IndexIVFPQ):
+        size = max(size, (1 << ivf.pq.nbits) * per_centroid)
+    return size
+
+
+def hnsw_of(index):
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    return index if isinstance(index, faiss.IndexHNSW) else None
+
+
+def search_params(index, nprobe=None, ef_search=None):
+    if faiss.try_extract_index_ivf(index) is not None:
+        return faiss.SearchParametersIVF(nprobe=nprobe or NPROBE)
+    if hnsw_of(index) is not None:
+        return faiss.SearchParametersHNSW(efSearch=ef_search or EF_SEARCH)
+    return None
+
+
+def describe(index):
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return {"type": type(faiss.downcast_index(ivf)).__name__, "nlist": ivf.nlist}
+    hnsw = hnsw_of(index)
+    if hnsw is not None:
+        return {"type": "IndexHNSWFlat", "M": hnsw.hnsw.nb_neighbors(1)}
+    return {"type": type(index).__name__}
@@ -0,0 +1,101 @@
+import re, time
+from collections import OrderedDict
+import numpy as np
+
+
+def normalize(question: str) -> str:
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip("?!. ")
+
+
+# Two-tier LRU/TTL cache for generated answers. The exact tier is keyed on the
+# normalized question text and skips embedding altogether. The semantic tier
+# reuses an answer whose question embedding is within `threshold` cosine
+# similarity of the new one (embeddings are already L2-normalized). Both tiers
+# only match answers retrieved with the same `params` (k, nprobe, ef_search,
+# mode), since those change which chunks the answer was built from.
+class AnswerCache:
+    def __init__(self, max_entries=1000, ttl=24 * 3600, threshold=0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.entries = OrderedDict()   # (question, params) -> (value, created, slot)
+        self.vectors = None            # one row per slot, allocated on first put
+        self.slot_keys = [None] * max_entries
+        self.free_slots = list(range(max_entries - 1, -1, -1))
+        self.fingerprint = None
+        self.counts = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    def validate(self, fingerprint):
+        # anything generated against another index or model is stale
+        if fingerprint != self.fingerprint:
+            if self.entries:
+                self.counts["invalidations"] += 1
+            self.clear()
+            self.fingerprint = fingerprint
+
+    def clear(self):
+        self.entries.clear()
+        self.slot_keys = [None] * self.max_entries
+        self.free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    def _alive(self, key):
+        value, created, slot = self.entries[key]
+        if time.time() - created <= self.ttl:
+            self.entries.move_to_end(key)
+            return value
+        self._drop(key)
+        self.counts["expired"] += 1
+        return None
+
+    def _drop(self, key):
+        _, _, slot = self.entries.pop(key)
+        self.slot_keys[slot] = None
+        self.free_slots.append(slot)
+
+    def get_exact(self, question, params):
+        key = (normalize(question), params)
+        value = self._alive(key) if key in self.entries else None
+        if value is not None:
+            self.counts["exact_hits"] += 1
+        return value
+
+    def get_similar(self, vector, params):
+        if self.vectors is None or not self.entries:
+            self.counts["misses"] += 1
+            return None
+        sims = self.vectors @ vector
+        for slot in np.argsort(-sims):
+            if sims[slot] < self.threshold:
+                break
+            key = self.slot_keys[slot]
+            if key is None or key[1] != params:
+                continue
+            value = self._alive(key)
+            if value is not None:
+                self.counts["semantic_hits"] += 1
+                return value
+        self.counts["misses"] += 1
+        return None
+
+    def put(self, question, params, vector, value):
+        key = (normalize(question), params)
+        if key in self.entries:
+            self._drop(key)
+        if not self.free_slots:
+            self._drop(next(iter(self.entries)))
+            self.counts["evictions"] += 1
+        if self.vectors is None:
+            self.vectors = np.zeros((self.max_entries, len(vector)), dtype="float32")
+        slot = self.free_slots.pop()
+        self.vectors[slot] = vector
+        self.slot_keys[slot] = key
+        self.entries[key] = (value, time.time(), slot)
+
+    def stats(self):
+        hits = self.counts["exact_hits"] + self.counts["semantic_hits"]
+        lookups = hits + self.counts["misses"]
+        return {
+            **self.counts,
+            "entries": len(self.entries),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,115 @@
+import asyncio, bisect, time
+from executors import ExecutorBusy
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128]
+QUEUE_WAIT_BUCKETS_MS = [0.5, 1, 2, 5, 10, 20, 50, 100]
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def snapshot(self):
+        labels = [f"<={b}" for b in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+# Coalesces single-item calls that arrive within max_wait_ms of each other
+# into one call of fn(items) on the executor, up to max_batch items, so that
+# concurrent requests share one encode / one index.search. fn must return one
+# result per item, in order.
+class MicroBatcher:
+    def __init__(self, fn, executor, max_batch=32, max_wait_ms=5, max_queued=256, name="batch"):
+        self.fn = fn
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_queued = max_queued
+        self.name = name
+        self.pending = []          # (item, future, enqueued at)
+        self.wake = None           # events and task are bound to the running loop on first submit
+        self.full = None
+        self.task = None
+        self.running = set()
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+
+    async def submit(self, item):
+        if self.task is None:
+            self.wake, self.full = asyncio.Event(), asyncio.Event()
+            self.task = asyncio.create_task(self._collect())
+        if len(self.pending) >= self.max_queued:
+            raise ExecutorBusy(f"{len(self.pending)} {self.name} items already queued")
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((item, future, time.perf_counter()))
+        self.wake.set()
+        if len(self.pending) >= self.max_batch:
+            self.full.set()
+        return await future
+
+    async def _collect(self):
+        while True:
+            await self.wake.wait()
+            if len(self.pending) < self.max_batch and self.max_wait > 0:
+                try:
+                    await asyncio.wait_for(self.full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            batch, self.pending = self.pending[:self.max_batch], self.pending[self.max_batch:]
+            if len(self.pending) < self.max_batch:
+                self.full.clear()
+            if not self.pending:
+                self.wake.clear()
+            # run without awaiting, so the next batch collects while this one computes
+            task = asyncio.create_task(self._run(batch))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _run(self, batch):
+        now = time.perf_counter()
+        # callers that went away (client disconnect) are dropped before computing
+        batch = [entry for entry in batch if not entry[1].done()]
+        if not batch:
+            return
+        self.batch_sizes.observe(len(batch))
+        for _, _, enqueued in batch:
+            self.queue_wait_ms.observe((now - enqueued) * 1000)
+        try:
+            results = await self.executor.run(self.fn, [item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "queued": len(self.pending),
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
+
+    async def aclose(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        for _, future, _ in self.pending:
+            future.cancel()
+        self.pending = []
@@ -0,0 +1,103 @@
+import argparse, json, time
+import faiss
+import numpy as np
+import ann
+from config import INDEX_FILE, IVF_NLIST, PQ_M, HNSW_M
+
+# training and adding use every core; searches use --threads
+build_threads = faiss.omp_get_max_threads()
+
+
+def load_vectors(path):
+    # the stored vectors of a flat index, in insertion order
+    index = faiss.read_index(path)
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if not isinstance(inner, faiss.IndexFlat):
+        raise SystemExit(f"{path} is not a flat index, use --synthetic")
+    return inner.reconstruct_n(0, inner.ntotal)
+
+
+def synthetic_vectors(n, dim, rng):
+    # clustered rather than uniform, closer to how document embeddings spread
+    centers = rng.standard_normal((max(n // 100, 1), dim)).astype("float32")
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.3 * rng.standard_normal((n, dim)).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def memory_mb(index):
+    return round(faiss.serialize_index(index).nbytes / 2 ** 20, 1)
+
+
+def bench(name, index, vectors, queries, truth, k, params=None, threads=1):
+    faiss.omp_set_num_threads(build_threads)
+    start = time.perf_counter()
+    if not index.is_trained:
+        index.train(vectors)
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype="int64"))
+    build = time.perf_counter() - start
+
+    faiss.omp_set_num_threads(threads)
+    results = []
+    for value in params or [None]:
+        search = ann.search_params(index, nprobe=value, ef_search=value)
+        latencies, found = [], []
+        for q in queries:
+            start = time.perf_counter()
+            _, I = index.search(q[None], k, params=search) if search is not None else index.search(q[None], k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found.append(I[0])
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        results.append({
+            "index": name,
+            "param": value,
+            f"recall@{k}": round(float(recall), 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            "memory_mb": memory_mb(index),
+            "build_s": round(build, 2),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall, latency, memory and build time of the ANN index types")
+    parser.add_argument("--index-file", default=INDEX_FILE, help="flat index whose vectors are benchmarked")
+    parser.add_argument("--synthetic", type=int, default=0, help="benchmark N random vectors instead")
+    parser.add_argument("--dim", type=int, default=768, help="dimension of --synthetic vectors")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nlist", type=int, default=IVF_NLIST)
+    parser.add_argument("--pq-m", type=int, default=PQ_M)
+    parser.add_argument("--hnsw-m", type=int, default=HNSW_M)
+    parser.add_argument("--nprobe", default="1,4,16,64", help="nprobe values swept for IVF indexes")
+    parser.add_argument("--ef-search", default="16,64,256", help="efSearch values swept for HNSW")
+    parser.add_argument("--threads", type=int, default=1, help="faiss search threads; 1 matches one query per request")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = synthetic_vectors(args.synthetic, args.dim, rng) if args.synthetic else load_vectors(args.index_file)
+    dim = vectors.shape[1]
+    # queries are perturbed copies of stored vectors, like paraphrased questions
+    queries = vectors[rng.choice(len(vectors), args.queries)] + 0.05 * rng.standard_normal((args.queries, dim)).astype("float32")
+    faiss.normalize_L2(queries)
+
+    exact = ann.new_index(dim, "flat")
+    exact.add_with_ids(vectors, np.arange(len(vectors), dtype="int64"))
+    _, truth = exact.search(queries, args.k)
+
+    options = {"nlist": args.nlist, "pq_m": args.pq_m, "hnsw_m": args.hnsw_m}
+    sweeps = {"flat": None,
+              "ivf_flat": [int(v) for v in args.nprobe.split(",")],
+              "ivf_pq": [int(v) for v in args.nprobe.split(",")],
+              "hnsw": [int(v) for v in args.ef_search.split(",")]}
+    print(f"vectors: {len(vectors)} x {dim}, queries: {args.queries}, k: {args.k}")
+    rows = []
+    for kind in ann.INDEX_TYPES:
+        index = ann.new_index(dim, kind, **options)
+        if ann.min_train_size(index, recommended=False) > len(vectors):
+            print(f"skipping {kind}: too few vectors to train ({ann.factory_string(kind, **options)})")
+            continue
+        rows += bench(ann.factory_string(kind, **options), index, vectors, queries, truth, args.k, sweeps[kind], args.threads)
+    for row in rows:
+        print(json.dumps(row))
@@ -0,0 +1,127 @@
+import argparse, json, os, tempfile, time, zlib
+import numpy as np
+from config import RAW_DIR, NEAR_DUP_THRESHOLD, MINHASH_PERM, LSH_BANDS
+from build_index import latest_documents, chunk_words, Embedder
+import ann
+import dedup
+
+# How much dedup.py shrinks the corpus, and what that saves when building the
+# index: chunks to embed, embedding + FAISS build time, and index size.
+#
+# --synthetic writes a corpus where each study appears once as an abstract and
+# again as copies from other sources (source-specific header/footer, a word or
+# two changed), plus boilerplate-heavy pages from one site, and reports how
+# many of the planted copies were found.
+#
+# --stand-in-ms swaps the embedding model for a hashed bag-of-words embedder
+# that takes that many milliseconds per chunk, for machines without the model;
+# build times then reflect that cost rather than the real model's.
+WORDS = 5000
+
+
+class StandInEmbedder:
+    dim = 64
+
+    def __init__(self, ms_per_chunk):
+        self.ms_per_chunk = ms_per_chunk
+
+    def encode(self, texts):
+        time.sleep(len(texts) * self.ms_per_chunk / 1000)
+        vectors = np.zeros((len(texts), self.dim), dtype="float32")
+        for i, text in enumerate(texts):
+            for word in text.split():
+                vectors[i, zlib.crc32(word.encode()) % self.dim] += 1
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def close(self):
+        pass
+
+
+def synthetic_corpus(path, n, copies, rng):
+    vocab = [f"w{i}" for i in range(WORDS)]
+    zipf = 1.0 / np.arange(1, WORDS + 1)
+    zipf /= zipf.sum()
+    nav = " ".join(rng.choice(vocab, 150, p=zipf))
+    planted = []
+    with open(os.path.join(path, "synthetic.jsonl"), "w", encoding="utf-8") as out:
+        for i in range(n):
+            words = list(rng.choice(vocab, int(rng.integers(150, 600)), p=zipf))
+            out.write(json.dumps({"url": f"https://pubmed/{i}", "source": "pubmed", "text": " ".join(words)}) + "\n")
+            for c in range(int(rng.integers(0, copies + 1))):
+                edited = list(words)
+                for _ in range(int(rng.integers(0, 3))):
+                    edited[int(rng.integers(0, len(edited)))] = str(rng.choice(vocab))
+                text = f"Reposted by source{c} " + " ".join(edited) + f" share this article source{c}"
+                out.write(json.dumps({"url": f"https://blog{c}/{i}", "source": f"blog{c}", "text": text}) + "\n")
+                planted.append((f"https://pubmed/{i}", f"https://blog{c}/{i}"))
+            if i % 10 == 0:
+                # mostly navigation, a couple of sentences of content
+                text = nav + " " + " ".join(rng.choice(vocab, 20, p=zipf))
+                out.write(json.dumps({"url": f"https://site/page{i}", "source": "site", "text": text}) + "\n")
+    return planted
+
+
+def planted_recall(planted, clusters_path):
+    cluster_of = {}
+    with open(clusters_path, encoding="utf-8") as f:
+        for n, line in enumerate(f):
+            record = json.loads(line)
+            for key in [record["canonical"]] + [d["key"] for d in record["duplicates"]]:
+                cluster_of[key] = n
+    found = sum(1 for a, b in planted if a in cluster_of and cluster_of.get(a) == cluster_of.get(b))
+    return round(found / max(len(planted), 1), 4)
+
+
+def build_cost(raw_dir, embedder, chunk_size, overlap):
+    chunks = [c for doc in latest_documents(raw_dir) for c in chunk_words(doc["text"], chunk_size, overlap)]
+    result = {"chunks": len(chunks)}
+    if embedder is None:
+        return result
+    start = time.perf_counter()
+    vectors = embedder.encode(chunks)
+    index = ann.new_index(embedder.dim, "flat")
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype="int64"))
+    import faiss
+    result.update({"build_s": round(time.perf_counter() - start, 2),
+                   "index_mb": round(faiss.serialize_index(index).nbytes / 2 ** 20, 1)})
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Corpus and index build savings from near-duplicate removal")
+    parser.add_argument("--raw-dir", default=RAW_DIR)
+    parser.add_argument("--synthetic", type=int, default=0, help="generate this many base documents instead")
+    parser.add_argument("--copies", type=int, default=3, help="max near-copies per synthetic document")
+    parser.add_argument("--threshold", type=float, default=NEAR_DUP_THRESHOLD)
+    parser.add_argument("--num-perm", type=int, default=MINHASH_PERM)
+    parser.add_argument("--bands", type=int, default=LSH_BANDS)
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--overlap", type=int, default=40)
+    parser.add_argument("--no-embed", action="store_true", help="only count chunks, skip embedding and FAISS")
+    parser.add_argument("--stand-in-ms", type=float, help="use a stand-in embedder costing this many ms per chunk")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_dir = args.raw_dir
+        planted = None
+        if args.synthetic:
+            raw_dir = os.path.join(tmp, "raw")
+            os.makedirs(raw_dir)
+            planted = synthetic_corpus(raw_dir, args.synthetic, args.copies, np.random.default_rng(0))
+        canonical, clusters = os.path.join(tmp, "canonical"), os.path.join(tmp, "clusters.jsonl")
+        stats = dedup.deduplicate(raw_dir, canonical, clusters, args.num_perm, args.bands, args.threshold)
+        if planted is not None:
+            stats["planted_copies"] = len(planted)
+            stats["planted_found"] = planted_recall(planted, clusters)
+        print(json.dumps({"dedup": stats}))
+
+        embedder = None if args.no_embed else StandInEmbedder(args.stand_in_ms) if args.stand_in_ms is not None else Embedder()
+        before = build_cost(raw_dir, embedder, args.chunk_size, args.overlap)
+        after = build_cost(canonical, embedder, args.chunk_size, args.overlap)
+        print(json.dumps({"index": "raw", **before}))
+        print(json.dumps({"index": "canonical", **after}))
+        print(f"chunks -{1 - after['chunks'] / max(before['chunks'], 1):.1%}"
+              + (f", build time {before['build_s']}s -> {after['build_s']}s (dedup itself {stats['seconds']}s)"
+                 if embedder else ""))
+        if embedder:
+            embedder.close()
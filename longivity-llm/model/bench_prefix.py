@@ -0,0 +1,149 @@
+import argparse, asyncio, json, re, threading, time, zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+from ollama_client import OllamaClient
+from prompts import NUTRITION_SYSTEM, ASK_SYSTEM, nutrition_prompt, ask_prompt
+
+# Measures how much prefill the system-prompt / keep_alive layout saves,
+# against a stand-in for Ollama that charges a fixed cost per evaluated
+# prompt token. Like Ollama's runner it keeps one KV cache: the longest common
+# token prefix with the previous sequence is reused, and the cache is dropped
+# when the model unloads after keep_alive.
+TOKENS = re.compile(r"\w+|[^\w\s]")
+
+
+def tokenize(text):
+    return [zlib.crc32(t.encode()) % 32000 for t in TOKENS.findall(text)]
+
+
+def seconds(keep_alive):
+    if isinstance(keep_alive, (int, float)):
+        return keep_alive
+    units = {"s": 1, "m": 60, "h": 3600}
+    value = str(keep_alive or "5m")
+    return float(value[:-1]) * units[value[-1]] if value[-1] in units else float(value)
+
+
+class StandIn:
+    def __init__(self, prefill_ms, decode_ms, load_ms, answer_tokens):
+        self.prefill_ms, self.decode_ms, self.load_ms = prefill_ms, decode_ms, load_ms
+        self.answer_tokens = answer_tokens
+        self.cache, self.unload_at = None, 0.0   # None = model not loaded
+        self.lock = threading.Lock()
+
+    def generate(self, body):
+        with self.lock:   # one sequence at a time, like OLLAMA_NUM_PARALLEL=1
+            start = time.perf_counter()
+            load = 0.0
+            if self.cache is None or time.monotonic() > self.unload_at:
+                load, self.cache = self.load_ms / 1000, []
+                time.sleep(load)
+            sequence = None
+            if body.get("prompt"):
+                sequence = tokenize("<|system|> " + body.get("system", "")) + tokenize("<|user|> " + body["prompt"] + " <|assistant|>")
+                reused = next((i for i, (a, b) in enumerate(zip(sequence, self.cache)) if a != b), min(len(sequence), len(self.cache)))
+                evaluated = len(sequence) - reused
+                generated = min(body.get("options", {}).get("num_predict", self.answer_tokens), self.answer_tokens)
+                time.sleep(evaluated * self.prefill_ms / 1000 + generated * self.decode_ms / 1000)
+                sequence += tokenize(" ok" * generated)
+                self.cache = sequence
+            keep_alive = seconds(body.get("keep_alive", "5m"))
+            if keep_alive == 0:
+                self.cache = None
+            self.unload_at = time.monotonic() + keep_alive
+            return {
+                "response": "ok " * (0 if sequence is None else generated), "done": True,
+                "context": sequence, "prompt_eval_count": 0 if sequence is None else evaluated,
+                "load_duration": int(load * 1e9), "total_duration": int((time.perf_counter() - start) * 1e9),
+            }
+
+
+def serve(stand_in):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            data = json.dumps(stand_in.generate(body)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def legacy_ask(context, question):
+    # the single-string /ask and /nutrition prompts from before the system prompt split
+    return f"You are a longevity assistant. Use only the following context:\n\n{context}\n\nUser question: {question}\n\nAnswer:"
+
+
+def legacy_prompt(profile, intraday, context, goal):
+    return ("\nYou are a personal health coach. Below is a user profile, recent activity data, and relevant expert information.\n\n"
+            + nutrition_prompt(profile, intraday, context, goal)
+            + "\nBased on all this information, give a complete personalized nutrition plan (with meals, timing, supplements)"
+              " that fits the goal and user constraints.\n")
+
+
+def requests_for(n, rng, mix):
+    goals = ["weight_loss", "muscle_gain", "better sleep", "lower blood pressure", "marathon training"]
+    words = "magnesium creatine omega fish oil protein fasting glucose insulin sleep vitamin muscle heart".split()
+    for i in range(n):
+        snippets = [f"[{j + 1}] " + " ".join(rng.choice(words, 60)) for j in range(5)]
+        if mix and i % 2:
+            yield "ask", ASK_SYSTEM, ("\n".join(snippets), f"Does {rng.choice(words)} help {rng.choice(goals)}?")
+        else:
+            profile = {"age": int(rng.integers(20, 70)), "weight": int(rng.integers(50, 110)), "height": int(rng.integers(150, 200))}
+            intraday = {"avg_per_day_7d_steps": int(rng.integers(2000, 15000)), "avg_per_day_7d_resting_hr": int(rng.integers(50, 80))}
+            yield "nutrition", NUTRITION_SYSTEM, (profile, intraday, snippets, str(rng.choice(goals)))
+
+
+async def run(host, layout, keep_alive, requests):
+    client = OllamaClient(host=host, keep_alive=keep_alive)
+    await client.warm()
+    evaluated, latencies = [], []
+    for kind, system, prompt in requests:
+        if kind == "nutrition":
+            prompt = legacy_prompt(*prompt) if layout == "single prompt" else nutrition_prompt(*prompt)
+        else:
+            prompt = legacy_ask(*prompt) if layout == "single prompt" else ask_prompt(*prompt)
+        start = time.perf_counter()
+        res = await (client.generate(prompt) if layout == "single prompt" else client.generate(prompt, system=system))
+        latencies.append((time.perf_counter() - start) * 1000)
+        evaluated.append(res.json()["prompt_eval_count"])
+    await client.aclose()
+    return {
+        "layout": layout, "keep_alive": keep_alive,
+        "prompt_tokens_evaluated": round(float(np.mean(evaluated)), 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 1),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 1),
+    }
+
+
+async def main(args):
+    stand_in = StandIn(args.prefill_ms, args.decode_ms, args.load_ms, args.answer_tokens)
+    server = serve(stand_in)
+    host = f"http://127.0.0.1:{server.server_port}"
+    runs = [("single prompt", "5m"), ("system", "0"), ("system", "30m")]
+    for layout, keep_alive in runs:
+        stand_in.cache = None
+        requests = list(requests_for(args.requests, np.random.default_rng(0), args.mix))
+        print(json.dumps(await run(host, layout, keep_alive, requests)))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prefill saved by a stable system prompt and keep_alive")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--prefill-ms", type=float, default=0.5, help="stand-in cost per evaluated prompt token")
+    parser.add_argument("--decode-ms", type=float, default=0.0, help="stand-in cost per generated token")
+    parser.add_argument("--load-ms", type=float, default=500, help="stand-in model load time")
+    parser.add_argument("--answer-tokens", type=int, default=0)
+    parser.add_argument("--mix", action="store_true", help="alternate /ask and /nutrition prompts on the one KV cache")
+    asyncio.run(main(parser.parse_args()))
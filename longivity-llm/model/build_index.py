@@ -0,0 +1,303 @@
+import argparse, glob, hashlib, json, os, sqlite3, time
+import numpy as np
+from config import (RAW_DIR, INDEX_FILE, CHUNK_STORE, INGEST_DB, LEXICAL_DB, EMBED_MODEL,
+                    INDEX_TYPE, IVF_NLIST, PQ_M, HNSW_M)
+from chunk_store import ChunkStore, ChunkStoreWriter
+import lexical
+import ann
+
+# Offline ingestion: data/raw/*.jsonl -> chunks -> embeddings -> FAISS.
+# Run dedup.py first and point --raw-dir at its CANONICAL_DIR to index one
+# copy of each near-duplicate cluster.
+#
+# Every document is keyed by url (or pmid / file:line) and fingerprinted by a
+# sha256 of its text. The manifest in INGEST_DB remembers which chunk ids each
+# document produced, so later runs only embed new or changed documents and
+# remove the vectors of changed ones. Vector ids are chunk store ids, and the
+# BM25 index in LEXICAL_DB uses the same ids as rowids.
+#
+# Work is checkpointed every --checkpoint-every batches: chunk store flushed,
+# index written, then the manifest committed together with the number of chunk
+# records it covers. A resumed run first rolls the chunk store and index back
+# to that count, so nothing written after the last checkpoint is duplicated.
+
+
+def iter_documents(raw_dir):
+    for path in sorted(glob.glob(os.path.join(raw_dir, "*.jsonl"))):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                text = record.get("text") or " ".join(
+                    part for part in (record.get("title"), record.get("abstract")) if part
+                )
+                if not text.strip():
+                    continue
+                key = record.get("key") or record.get("url") or record.get("pmid") or f"{stem}:{line_no}"
+                yield {
+                    "key": key,
+                    "text": text,
+                    "source": record.get("source") or stem,
+                    "url": record.get("url", ""),
+                    "title": record.get("title", ""),
+                }
+
+
+def latest_documents(raw_dir):
+    # the crawlers append a new line whenever a page changes, so the last
+    # line for a key is its current version
+    latest = {doc["key"]: position for position, doc in enumerate(iter_documents(raw_dir))}
+    for position, doc in enumerate(iter_documents(raw_dir)):
+        if latest[doc["key"]] == position:
+            yield doc
+
+
+def chunk_words(text, size, overlap):
+    words = text.split()
+    step = max(size - overlap, 1)
+    for start in range(0, max(len(words) - overlap, 1), step):
+        yield " ".join(words[start:start + size])
+
+
+class Manifest:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS docs (key TEXT PRIMARY KEY, hash TEXT, chunk_ids TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+    def get(self, key):
+        return self.conn.execute("SELECT hash, chunk_ids FROM docs WHERE key = ?", (key,)).fetchone()
+
+    def keys(self):
+        return [row[0] for row in self.conn.execute("SELECT key FROM docs")]
+
+    def meta(self, name, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, name, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, json.dumps(value)))
+
+    def stage(self, key, digest, chunk_ids):
+        self.conn.execute("INSERT OR REPLACE INTO docs (key, hash, chunk_ids) VALUES (?, ?, ?)",
+                          (key, digest, json.dumps(chunk_ids)))
+
+    def drop(self, key):
+        self.conn.execute("DELETE FROM docs WHERE key = ?", (key,))
+
+    def commit(self, chunk_count):
+        self.set_meta("chunk_count", chunk_count)
+        self.conn.commit()
+
+
+class Embedder:
+    def __init__(self, processes=0, batch_size=64):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(EMBED_MODEL, trust_remote_code=True)
+        self.batch_size = batch_size
+        self.pool = None
+        if processes > 1:
+            devices = ["cpu"] * processes
+            self.pool = self.model.start_multi_process_pool(target_devices=devices)
+
+    @property
+    def dim(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts):
+        if self.pool:
+            vectors = self.model.encode_multi_process(texts, self.pool, batch_size=self.batch_size)
+        else:
+            vectors = self.model.encode(texts, batch_size=self.batch_size)
+        vectors = np.asarray(vectors, dtype="float32")
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+    def close(self):
+        if self.pool:
+            self.model.stop_multi_process_pool(self.pool)
+
+
+def write_index(index, path):
+    import faiss
+    tmp = f"{path}.tmp"
+    faiss.write_index(index, tmp)
+    os.replace(tmp, path)
+
+
+class IndexBuilder:
+    def __init__(self, args):
+        import faiss
+        self.args = args
+        if args.rebuild:
+            for path in (INDEX_FILE, f"{CHUNK_STORE}.bin", f"{CHUNK_STORE}.idx", INGEST_DB, LEXICAL_DB):
+                if os.path.exists(path):
+                    os.remove(path)
+        self.manifest = Manifest(INGEST_DB)
+        self.store = ChunkStoreWriter(CHUNK_STORE)
+        self.embedder = Embedder(args.processes, args.embed_batch_size)
+
+        committed = self.manifest.meta("chunk_count", 0)
+        if self.manifest.meta("embed_model", EMBED_MODEL) != EMBED_MODEL:
+            raise SystemExit("Index was built with a different embedding model, rerun with --rebuild")
+        if self.manifest.meta("index_type", "flat" if committed else args.index_type) != args.index_type:
+            raise SystemExit(f"Index was built as {self.manifest.meta('index_type')}, rerun with --rebuild to change it")
+        if os.path.exists(INDEX_FILE) and committed:
+            self.index = faiss.read_index(INDEX_FILE)
+        else:
+            self.index = ann.new_index(self.embedder.dim, args.index_type,
+                                       nlist=args.nlist, pq_m=args.pq_m, hnsw_m=args.hnsw_m)
+            committed = 0
+        # roll back anything written after the last checkpoint. Vector ids come
+        # from the chunk store, so the index can only hold ids >= committed when
+        # the store does; a clean previous run leaves nothing to remove, which
+        # keeps indexes that cannot remove vectors (hnsw) usable across runs.
+        if self.store.count > committed:
+            print(f"Resuming: discarding {self.store.count - committed} uncommitted chunks")
+            self.store.truncate(committed)
+            if self.index.ntotal:
+                self.remove_ids(faiss.IDSelectorRange(committed, 2 ** 62))
+        if committed and not lexical.LexicalIndex.exists(LEXICAL_DB):
+            print("Backfilling the lexical index from the chunk store")
+            live = sorted(i for key in self.manifest.keys() for i in json.loads(self.manifest.get(key)[1]))
+            lexical.build(ChunkStore(CHUNK_STORE), live, LEXICAL_DB)
+        self.lexical = lexical.LexicalIndex(LEXICAL_DB)
+        self.lexical.truncate(committed)
+        # IVF indexes need training: vectors are held back until there are enough
+        self.untrained_vectors, self.untrained_ids = [], []
+
+        self.pending_texts, self.pending_records, self.pending_docs = [], [], []
+        self.removed = []
+        self.batches_since_checkpoint = 0
+        self.stats = {"docs_seen": 0, "docs_unchanged": 0, "docs_embedded": 0, "chunks_embedded": 0, "docs_removed": 0}
+
+    def add_document(self, doc):
+        self.stats["docs_seen"] += 1
+        digest = hashlib.sha256(doc["text"].encode("utf-8")).hexdigest()
+        previous = self.manifest.get(doc["key"])
+        if previous and previous[0] == digest:
+            self.stats["docs_unchanged"] += 1
+            return
+        if previous:
+            self.removed.extend(json.loads(previous[1]))
+
+        chunks = list(chunk_words(doc["text"], self.args.chunk_size, self.args.overlap))
+        for chunk in chunks:
+            self.pending_texts.append(chunk)
+            self.pending_records.append({"text": chunk, "source": doc["source"], "url": doc["url"],
+                                         "title": doc["title"], "doc": doc["key"], "hash": digest})
+        self.pending_docs.append((doc["key"], digest, len(chunks)))
+        if len(self.pending_texts) >= self.args.batch_size:
+            self.flush_batch()
+
+    def remove_documents(self, keys):
+        for key in keys:
+            row = self.manifest.get(key)
+            if row:
+                self.removed.extend(json.loads(row[1]))
+                self.manifest.drop(key)
+                self.stats["docs_removed"] += 1
+
+    def remove_ids(self, ids):
+        try:
+            self.index.remove_ids(ids)
+        except RuntimeError:
+            raise SystemExit(f"{self.args.index_type} indexes cannot remove vectors, rerun with --rebuild")
+
+    def add_vectors(self, vectors, ids, final=False):
+        if self.index.is_trained:
+            self.index.add_with_ids(vectors, ids)
+            return
+        self.untrained_vectors.append(vectors)
+        self.untrained_ids.append(ids)
+        held = sum(len(v) for v in self.untrained_vectors)
+        if held >= ann.min_train_size(self.index) or (final and held):
+            vectors, ids = np.vstack(self.untrained_vectors), np.concatenate(self.untrained_ids)
+            if len(vectors) < ann.min_train_size(self.index, recommended=False):
+                raise SystemExit(f"Only {len(vectors)} vectors to train the {self.args.index_type} index, use a smaller --nlist or a flat index")
+            print(f"Training {self.args.index_type} index on {len(vectors)} vectors")
+            self.index.train(vectors)
+            self.index.add_with_ids(vectors, ids)
+            self.untrained_vectors, self.untrained_ids = [], []
+
+    def flush_batch(self, final=False):
+        if self.removed:
+            self.remove_ids(np.array(self.removed, dtype="int64"))
+            self.lexical.remove(self.removed)
+            self.removed = []
+        if self.pending_texts:
+            vectors = self.embedder.encode(self.pending_texts)
+            ids = np.array([self.store.append(record) for record in self.pending_records], dtype="int64")
+            self.add_vectors(vectors, ids, final)
+            self.lexical.add(ids, self.pending_texts)
+            offset = 0
+            for key, digest, n in self.pending_docs:
+                self.manifest.stage(key, digest, ids[offset:offset + n].tolist())
+                offset += n
+            self.stats["docs_embedded"] += len(self.pending_docs)
+            self.stats["chunks_embedded"] += len(ids)
+            print(f"Embedded {self.stats['chunks_embedded']} chunks from {self.stats['docs_embedded']} documents")
+        elif final and self.untrained_vectors:
+            self.add_vectors(np.empty((0, self.embedder.dim), dtype="float32"), np.empty(0, dtype="int64"), final)
+        self.pending_texts, self.pending_records, self.pending_docs = [], [], []
+        self.batches_since_checkpoint += 1
+        # no checkpoint while vectors are still held back for training
+        if self.batches_since_checkpoint >= self.args.checkpoint_every and not self.untrained_vectors:
+            self.checkpoint()
+
+    def checkpoint(self):
+        if not self.index.is_trained:
+            return
+        self.store.flush()
+        write_index(self.index, INDEX_FILE)
+        self.lexical.commit()
+        self.manifest.set_meta("embed_model", EMBED_MODEL)
+        self.manifest.set_meta("index_type", self.args.index_type)
+        self.manifest.commit(self.store.count)
+        self.batches_since_checkpoint = 0
+
+    def run(self, raw_dir):
+        start = time.perf_counter()
+        seen = set()
+        for doc in latest_documents(raw_dir):
+            seen.add(doc["key"])
+            self.add_document(doc)
+        if self.args.prune:
+            self.remove_documents([key for key in self.manifest.keys() if key not in seen])
+        self.flush_batch(final=True)
+        self.checkpoint()
+        self.store.close()
+        self.lexical.close()
+        self.embedder.close()
+        self.stats["index_vectors"] = self.index.ntotal
+        self.stats["seconds"] = round(time.perf_counter() - start, 1)
+        return self.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or incrementally update the FAISS index from data/raw JSONL")
+    parser.add_argument("--raw-dir", default=RAW_DIR)
+    parser.add_argument("--chunk-size", type=int, default=200, help="words per chunk")
+    parser.add_argument("--overlap", type=int, default=40, help="words shared by consecutive chunks")
+    parser.add_argument("--batch-size", type=int, default=1024, help="chunks embedded per batch")
+    parser.add_argument("--embed-batch-size", type=int, default=64, help="SentenceTransformer.encode batch size")
+    parser.add_argument("--processes", type=int, default=0, help="embed with a multi-process pool of this size")
+    parser.add_argument("--checkpoint-every", type=int, default=10, help="batches between checkpoints")
+    parser.add_argument("--index-type", choices=ann.INDEX_TYPES, default=INDEX_TYPE)
+    parser.add_argument("--nlist", type=int, default=IVF_NLIST, help="IVF lists (ivf_flat, ivf_pq)")
+    parser.add_argument("--pq-m", type=int, default=PQ_M, help="PQ sub-quantizers (ivf_pq); must divide the dimension")
+    parser.add_argument("--hnsw-m", type=int, default=HNSW_M, help="graph degree (hnsw)")
+    parser.add_argument("--prune", action="store_true", help="drop documents no longer present in the raw files")
+    parser.add_argument("--rebuild", action="store_true", help="discard the existing index, chunk store and manifest")
+    args = parser.parse_args()
+
+    stats = IndexBuilder(args).run(args.raw_dir)
+    print(json.dumps(stats, indent=2))
@@ -1,99 +1,133 @@
-import os, json
-import pandas as pd
-import requests
-from fastapi import FastAPI, HTTPException
+import os, re, sqlite3, sys
+import httpx
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
-from sentence_transformers import SentenceTransformer
-import faiss
-import numpy as np
-from config import ACCESS_TOKEN
-
-app = FastAPI()
-
-OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
-OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
-
-EMBED_MODEL = "nomic-ai/nomic-embed-text-v1"
-INDEX_FILE = "../data/faiss_index/index.faiss"
-META_FILE = "../data/faiss_index/metadata.json"
-TOP_K = 8
-
-index = faiss.read_index(INDEX_FILE)
-with open(META_FILE, encoding="utf-8") as f:
-    metadata = json.load(f)
-embedder = SentenceTransformer(EMBED_MODEL, trust_remote_code=True)
+from config import (ACCESS_TOKEN, API_BASE, COMPUTE_WORKERS, COMPUTE_MAX_PENDING, TOP_K,
+                    BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, BATCH_MAX_QUEUED, FITBIT_DIR)
+from batcher import MicroBatcher
+# appended, not prepended, so this service's own config module still wins
+sys.path.append(FITBIT_DIR)
+from profile_cache import profiles, ProfileError
+from prompts import NUTRITION_SYSTEM, nutrition_prompt
+from context_packer import (PROFILE_FIELDS, pack_snippets, context_blocks, compact_fields, estimate_tokens,
+                            remaining_budget)
+from executors import BoundedExecutor, ExecutorBusy
+from ollama_client import OllamaClient, relay
+import retrieval
+
+INTRADAY_DB = os.getenv("INTRADAY_DB", "../../intraday_activity_metrics.db")
+# per-user stores written by Fitbit/sync_scheduler.py
+INTRADAY_USER_DIR = os.getenv("INTRADAY_USER_DIR", "../../Fitbit/users")
+ROLLUP_LABELS = {1: "latest_day", 7: "avg_per_day_7d", 30: "avg_per_day_30d"}
+
+compute = None
+ollama = None
+fitbit = None
+embedder = None
+searcher = None
+
+@asynccontextmanager
+async def lifespan(app):
+    global compute, ollama, fitbit, embedder, searcher
+    compute = BoundedExecutor(COMPUTE_WORKERS, COMPUTE_MAX_PENDING)
+    ollama = OllamaClient()
+    fitbit = httpx.AsyncClient(base_url=API_BASE, timeout=10)
+    embedder = MicroBatcher(retrieval.embed, compute, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, BATCH_MAX_QUEUED, "embed")
+    searcher = MicroBatcher(retrieval.search_batch, compute, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, BATCH_MAX_QUEUED, "search")
+    await compute.run(retrieval.warmup)
+    await ollama.warm()
+    yield
+    await embedder.aclose()
+    await searcher.aclose()
+    await ollama.aclose()
+    await fitbit.aclose()
+    compute.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.exception_handler(ExecutorBusy)
+async def executor_busy(request: Request, exc: ExecutorBusy):
+    return JSONResponse(status_code=503, content={"error": "Server busy, retry shortly."}, headers={"Retry-After": "1"})
 
 class NutritionQuery(BaseModel):
     goal: str
     override_profile: Optional[dict] = None
+    stream: bool = False
+    user_id: Optional[str] = None
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+
+async def retrieve_context(query: str, budget: int, k: int = TOP_K, nprobe=None, ef_search=None) -> tuple[list[str], list[dict]]:
+    # snippets packed into `budget` estimated tokens, best ranked first
+    vec = await embedder.submit(query)
+    results = await searcher.submit((query, vec, k, nprobe, ef_search))
+    return context_blocks(pack_snippets(query, results, budget))
+
+async def get_fitbit_profile():
+    try:
+        return await profiles.get(fitbit, ACCESS_TOKEN)
+    except ProfileError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+def get_intraday_summary(user_id=None):
+    # daily and rolling 7/30-day rollups precomputed by IntradayStore on every sync
+    if user_id is not None and not re.fullmatch(r"[\w.-]+", user_id):
+        raise HTTPException(status_code=400, detail="Invalid user_id")
+    path = os.path.join(INTRADAY_USER_DIR, f"{user_id}.db") if user_id else INTRADAY_DB
+    if not os.path.exists(path):
+        return {}
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute("SELECT * FROM rollups ORDER BY window_days").fetchall()
+    except sqlite3.OperationalError:
+        rows = []   # store not opened since rollups were added
+    finally:
+        conn.close()
+    summary = {}
+    for row in map(dict, rows):
+        window = row.pop("window_days")
+        label = ROLLUP_LABELS.get(window, f"avg_per_day_{window}d")
+        summary.update({f"{label}_{name}": value for name, value in row.items()})
+    return summary
+
+@app.get("/retrieval/stats")
+def retrieval_stats():
+    return retrieval.stats()
+
+@app.get("/profile/cache")
+def profile_cache_stats():
+    return profiles.stats()
+
+@app.get("/batching/stats")
+def batching_stats():
+    return {"embed": embedder.stats(), "search": searcher.stats()}
 
-def embed(texts: list[str]) -> np.ndarray:
-    vectors = embedder.encode(texts, batch_size=16, normalize_embeddings=True)
-    return np.asarray(vectors, dtype="float32")
-
-def retrieve_context(query: str, k: int = TOP_K) -> list[str]:
-    vec = embed([query])
-    D, I = index.search(vec, k)
-    ctx_blocks = []
-    for rank, idx in enumerate(I[0]):
-        meta = metadata[idx]
-        snippet = meta.get("text", "").strip().replace("\n", " ")
-        ctx_blocks.append(f"[{rank+1}] {snippet}")
-    return ctx_blocks
-
-def get_fitbit_profile():
-    url = "https://api.fitbit.com/1/user/-/profile.json"
-    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
-    res = requests.get(url, headers=headers)
-    if res.status_code != 200:
-        raise HTTPException(status_code=res.status_code, detail=res.text)
-    return res.json()["user"]
-
-def get_intraday_summary():
-    df = pd.read_csv("../../intraday_activity_metrics.csv")
-    latest = df.iloc[-1].to_dict()
-    return latest
-
-def build_prompt(profile, intraday, context, goal) -> str:
-    profile_text = '\n'.join([f"{k.capitalize()}: {v}" for k, v in profile.items()])
-    activity_text = '\n'.join([f"{k}: {v}" for k, v in intraday.items()])
-    rag_text = '\n'.join(context)
-    return f"""
-You are a personal health coach. Below is a user profile, recent activity data, and relevant expert information.
-
-User Goal: {goal}
-
-User Profile:
-{profile_text}
-
-Recent Activity:
-{activity_text}
-
-Knowledge Base:
-{rag_text}
+@app.post("/nutrition")
+async def generate_nutrition_plan(query: NutritionQuery):
+    profile = compact_fields(query.override_profile or await get_fitbit_profile(), PROFILE_FIELDS)
+    intraday = compact_fields(await run_in_threadpool(get_intraday_summary, query.user_id))
+    budget = remaining_budget(NUTRITION_SYSTEM + nutrition_prompt(profile, intraday, [], query.goal))
+    context, citations = await retrieve_context(query.goal, budget, TOP_K, query.nprobe, query.ef_search)
+    prompt = nutrition_prompt(profile, intraday, context, query.goal)
+    prompt_tokens = estimate_tokens(NUTRITION_SYSTEM + prompt)
 
-Based on all this information, give a complete personalized nutrition plan (with meals, timing, supplements) that fits the goal and user constraints.
-"""
+    if query.stream:
+        frames = [{"citations": citations, "prompt_tokens": prompt_tokens}]
+        return StreamingResponse(relay(frames, ollama.stream(prompt, system=NUTRITION_SYSTEM)), media_type="application/x-ndjson")
 
-@app.post("/nutrition")
-def generate_nutrition_plan(query: NutritionQuery):
-    profile = query.override_profile or get_fitbit_profile()
-    intraday = get_intraday_summary()
-    context = retrieve_context(query.goal)
-    prompt = build_prompt(profile, intraday, context, query.goal)
-
-    res = requests.post(
-        f"{OLLAMA_HOST}/api/generate",
-        json={"model": OLLAMA_MODEL, "prompt": prompt, "stream": False},
-        timeout=90
-    )
+    res = await ollama.generate(prompt, system=NUTRITION_SYSTEM)
 
     if res.status_code != 200:
         return {"error": res.text}
 
     data = res.json()
-    return {"nutrition_plan": data.get("response", "").strip()}
+    return {"nutrition_plan": data.get("response", "").strip(), "citations": citations,
+            "prompt_tokens": prompt_tokens, "prompt_eval_count": data.get("prompt_eval_count")}
 
 if __name__ == "__main__":
     import uvicorn
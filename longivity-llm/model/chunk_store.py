@@ -0,0 +1,121 @@
+import json, mmap, os, sys
+import numpy as np
+
+# On-disk chunk metadata addressed by FAISS id.
+#   <base>.bin  UTF-8 JSON records written back to back
+#   <base>.idx  little-endian uint64 offsets, n + 1 of them, so record i is
+#               bin[idx[i]:idx[i + 1]]
+# Both files are memory-mapped; a record is only decoded when it is looked up.
+OFFSET_DTYPE = np.dtype("<u8")
+
+
+class ChunkStore:
+    def __init__(self, base):
+        self.base = base
+        self._data = None
+        self._offsets = None
+        self.refresh()
+
+    def refresh(self):
+        # re-map after a writer appended records
+        self.close()
+        with open(f"{self.base}.bin", "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._offsets = np.memmap(f"{self.base}.idx", dtype=OFFSET_DTYPE, mode="r")
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = None
+        self._offsets = None
+
+    def __len__(self):
+        return max(len(self._offsets) - 1, 0)
+
+    def __getitem__(self, i):
+        i = int(i)
+        if i < 0 or i >= len(self):
+            raise IndexError(i)
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return json.loads(self._data[start:end])
+
+    @staticmethod
+    def exists(base):
+        return os.path.exists(f"{base}.bin") and os.path.exists(f"{base}.idx")
+
+
+class ChunkStoreWriter:
+    def __init__(self, base):
+        self.base = base
+        os.makedirs(os.path.dirname(base) or ".", exist_ok=True)
+        if not ChunkStore.exists(base):
+            open(f"{base}.bin", "wb").close()
+            np.zeros(1, dtype=OFFSET_DTYPE).tofile(f"{base}.idx")
+        self.data = open(f"{base}.bin", "ab")
+        self.offsets = open(f"{base}.idx", "ab")
+        self.count = os.path.getsize(f"{base}.idx") // OFFSET_DTYPE.itemsize - 1
+        self.end = self._offset(self.count)
+        # a crash mid-append can leave a partial offset or record behind
+        self.offsets.truncate((self.count + 1) * OFFSET_DTYPE.itemsize)
+        self.data.truncate(self.end)
+
+    def _offset(self, i):
+        return int(np.fromfile(f"{self.base}.idx", dtype=OFFSET_DTYPE, count=1, offset=i * OFFSET_DTYPE.itemsize)[0])
+
+    def append(self, record):
+        # returns the id of the new record
+        blob = json.dumps(record, ensure_ascii=False).encode("utf-8")
+        self.data.write(blob)
+        self.end += len(blob)
+        self.offsets.write(np.array([self.end], dtype=OFFSET_DTYPE).tobytes())
+        self.count += 1
+        return self.count - 1
+
+    def truncate(self, count):
+        # drop records appended after the last checkpoint
+        if count >= self.count:
+            return
+        self.data.flush()
+        self.offsets.flush()
+        self.end = self._offset(count)
+        self.data.truncate(self.end)
+        self.offsets.truncate((count + 1) * OFFSET_DTYPE.itemsize)
+        self.count = count
+
+    def flush(self):
+        # data before offsets, so a reader never sees an offset past the data
+        self.data.flush()
+        os.fsync(self.data.fileno())
+        self.offsets.flush()
+        os.fsync(self.offsets.fileno())
+
+    def close(self):
+        self.flush()
+        self.data.close()
+        self.offsets.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert(meta_file, base):
+    with open(meta_file, encoding="utf-8") as f:
+        metadata = json.load(f)
+    for suffix in (".bin", ".idx"):
+        if os.path.exists(base + suffix):
+            os.remove(base + suffix)
+    with ChunkStoreWriter(base) as writer:
+        for record in metadata:
+            writer.append(record)
+    return len(metadata)
+
+
+if __name__ == "__main__":
+    from config import META_FILE, CHUNK_STORE
+    meta_file = sys.argv[1] if len(sys.argv) > 1 else META_FILE
+    base = sys.argv[2] if len(sys.argv) > 2 else CHUNK_STORE
+    print(f"Converted {convert(meta_file, base)} records from {meta_file} → {base}.bin/.idx")
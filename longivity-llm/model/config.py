@@ -6,4 +6,59 @@ load_dotenv(dotenv_path)
 
 ACCESS_TOKEN = os.getenv("FITBIT_ACCESS_TOKEN")
 CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY")
-API_BASE = "https://api.fitbit.com"
\ No newline at end of file
+API_BASE = "https://api.fitbit.com"
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "90"))
+# how long Ollama keeps the model (and its KV cache) loaded after a request
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", "2"))
+COMPUTE_MAX_PENDING = int(os.getenv("COMPUTE_MAX_PENDING", "32"))
+# concurrent queries are embedded / searched together; BATCH_MAX_SIZE=1 turns it off
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+BATCH_MAX_QUEUED = int(os.getenv("BATCH_MAX_QUEUED", "256"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+EMBED_MODEL = os.getenv("EMBED_MODEL", "nomic-ai/nomic-embed-text-v1")
+INDEX_FILE = os.getenv("INDEX_FILE", "../data/faiss_index/index.faiss")
+META_FILE = os.getenv("META_FILE", "../data/faiss_index/metadata.json")
+TOP_K = int(os.getenv("TOP_K", "8"))
+# memory-map the index so every worker process shares one copy in the page cache
+FAISS_MMAP = os.getenv("FAISS_MMAP", "1") == "1"
+# offset-indexed chunk store built by chunk_store.py; preferred over META_FILE when present
+CHUNK_STORE = os.getenv("CHUNK_STORE", "../data/faiss_index/chunks")
+RAW_DIR = os.getenv("RAW_DIR", "../data/raw")
+INGEST_DB = os.getenv("INGEST_DB", "../data/faiss_index/ingest.db")
+# index layout used by build_index.py: flat, ivf_flat, ivf_pq or hnsw
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+IVF_NLIST = int(os.getenv("IVF_NLIST", "1024"))
+PQ_M = int(os.getenv("PQ_M", "64"))
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+# default search-time knobs, overridable per request
+NPROBE = int(os.getenv("NPROBE", "16"))
+EF_SEARCH = int(os.getenv("EF_SEARCH", "64"))
+# prompt size control: estimated tokens for the whole prompt, and per retrieved snippet
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2048"))
+SNIPPET_MAX_TOKENS = int(os.getenv("SNIPPET_MAX_TOKENS", "160"))
+# snippets sharing at least this fraction of word 3-grams with a kept one are dropped
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+# lexical (BM25) index over the chunk store, fused with FAISS results
+LEXICAL_DB = os.getenv("LEXICAL_DB", "../data/faiss_index/lexical.db")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")   # dense, lexical or hybrid
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# optional cross-encoder applied to the fused candidates, e.g. cross-encoder/ms-marco-MiniLM-L-6-v2
+RERANK_MODEL = os.getenv("RERANK_MODEL", "")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+# the Fitbit service directory; its profile_cache.py is shared with this service
+FITBIT_DIR = os.getenv("FITBIT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Fitbit"))
+# near-duplicate removal between RAW_DIR and indexing, see dedup.py
+CANONICAL_DIR = os.getenv("CANONICAL_DIR", "../data/canonical")
+DEDUP_CLUSTERS = os.getenv("DEDUP_CLUSTERS", "../data/dedup_clusters.jsonl")
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+MINHASH_PERM = int(os.getenv("MINHASH_PERM", "128"))
+LSH_BANDS = int(os.getenv("LSH_BANDS", "32"))
+SHINGLE_SIZE = int(os.getenv("SHINGLE_SIZE", "5"))
@@ -0,0 +1,110 @@
+import re
+from config import PROMPT_TOKEN_BUDGET, SNIPPET_MAX_TOKENS, DEDUP_THRESHOLD
+from lexical import STOPWORDS
+
+# Keeps prompts inside a token budget. Ollama prefill time grows with prompt
+# length, so retrieved text is deduplicated, trimmed to the sentences that
+# mention the question's terms and packed best-ranked first until the budget
+# runs out.
+#
+# Token counts are estimates (one per word or punctuation mark, plus one per
+# 6 characters of long words), close enough to llama-style BPE for budgeting
+# without loading a tokenizer.
+PIECES = re.compile(r"\w+|[^\w\s]")
+SENTENCES = re.compile(r"(?<=[.!?])\s+")
+# profile fields worth prompt space; the Fitbit profile also carries avatars,
+# locale settings and feature flags
+PROFILE_FIELDS = ["age", "gender", "height", "heightUnit", "weight", "weightUnit", "averageDailySteps",
+                  "strideLengthWalking", "strideLengthRunning", "timezone", "goal", "diet", "allergies"]
+
+
+def estimate_tokens(text: str) -> int:
+    return sum(1 + len(piece) // 6 for piece in PIECES.findall(text))
+
+
+def terms(text: str) -> set[str]:
+    return {t for t in re.findall(r"\w+", text.lower()) if t not in STOPWORDS}
+
+
+def shingles(text: str, n: int = 3) -> set[tuple]:
+    words = text.lower().split()
+    return {tuple(words[i:i + n]) for i in range(max(len(words) - n + 1, 1))}
+
+
+def near_duplicate(a: set, b: set, threshold: float = DEDUP_THRESHOLD) -> bool:
+    return bool(a and b) and len(a & b) / len(a | b) >= threshold
+
+
+def best_window(words: list[str], wanted: set[str], max_tokens: int) -> list[str]:
+    # the run of words that fits max_tokens and mentions the most query terms
+    costs = [estimate_tokens(w) for w in words]
+    best, best_score, start, total, score = (0, 0), -1, 0, 0, 0
+    for end, word in enumerate(words):
+        total += costs[end]
+        score += word.lower().strip(".,;:!?()") in wanted
+        while total > max_tokens:
+            total -= costs[start]
+            score -= words[start].lower().strip(".,;:!?()") in wanted
+            start += 1
+        if score > best_score:
+            best, best_score = (start, end + 1), score
+    return words[best[0]:best[1]]
+
+
+def trim_snippet(text: str, query: str, max_tokens: int = SNIPPET_MAX_TOKENS) -> str:
+    text = " ".join(text.split())
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    wanted = terms(query)
+    sentences = SENTENCES.split(text)
+    if len(sentences) == 1:
+        return " ".join(best_window(text.split(), wanted, max_tokens)) + " …"
+    # most relevant sentences first, then put back in reading order
+    ranked = sorted(range(len(sentences)), key=lambda i: (-len(terms(sentences[i]) & wanted), i))
+    kept, used = [], 0
+    for i in ranked:
+        cost = estimate_tokens(sentences[i])
+        if used + cost > max_tokens:
+            continue
+        kept.append(i)
+        used += cost
+    if not kept:
+        return " ".join(best_window(sentences[ranked[0]].split(), wanted, max_tokens)) + " …"
+    return " … ".join(sentences[i] for i in sorted(kept))
+
+
+def pack_snippets(query: str, hits: list[dict], budget: int, max_snippet_tokens: int = SNIPPET_MAX_TOKENS) -> list[dict]:
+    # hits in rank order -> the ones that fit, renumbered, each with a trimmed "snippet"
+    packed, seen, used = [], [], 0
+    for hit in hits:
+        grams = shingles(hit["text"])
+        if any(near_duplicate(grams, other) for other in seen):
+            continue
+        snippet = trim_snippet(hit["text"], query, max_snippet_tokens)
+        block = f"[{len(packed) + 1}] {snippet}"
+        cost = estimate_tokens(block) + 1
+        if used + cost > budget:
+            break
+        seen.append(grams)
+        packed.append({**hit, "rank": len(packed) + 1, "snippet": snippet})
+        used += cost
+    return packed
+
+
+def context_blocks(packed: list[dict]) -> tuple[list[str], list[dict]]:
+    ctx_blocks = [f"[{hit['rank']}] {hit['snippet']}" for hit in packed]
+    citations = [{"rank": hit["rank"], "source": hit["source"], "url": hit["url"]} for hit in packed]
+    return ctx_blocks, citations
+
+
+def compact_fields(fields: dict, keep: list[str] | None = None) -> dict:
+    # scalar, non-empty fields only; `keep` picks and orders them when any are present
+    scalars = {k: v for k, v in fields.items() if v not in (None, "") and isinstance(v, (str, int, float, bool))}
+    scalars = {k: v for k, v in scalars.items() if not (isinstance(v, str) and v.startswith("http"))}
+    if keep and any(k in scalars for k in keep):
+        return {k: scalars[k] for k in keep if k in scalars}
+    return scalars
+
+
+def remaining_budget(fixed_prompt: str, budget: int = PROMPT_TOKEN_BUDGET) -> int:
+    return max(budget - estimate_tokens(fixed_prompt), 0)
@@ -0,0 +1,172 @@
+import argparse, json, os, re, time, zlib
+import numpy as np
+from config import (RAW_DIR, CANONICAL_DIR, DEDUP_CLUSTERS, NEAR_DUP_THRESHOLD, MINHASH_PERM, LSH_BANDS,
+                    SHINGLE_SIZE)
+from build_index import latest_documents
+
+# Near-duplicate removal: data/raw/*.jsonl -> CANONICAL_DIR/canonical.jsonl.
+#
+# Each document becomes a set of word SHINGLE_SIZE-grams, summarised by a
+# MINHASH_PERM-value MinHash signature; the fraction of equal values between
+# two signatures estimates their Jaccard similarity. Signatures are cut into
+# LSH_BANDS bands and documents sharing any band become candidates, so only
+# candidates are compared and the whole pass stays close to linear. Candidate
+# pairs at or above NEAR_DUP_THRESHOLD are joined into clusters. Each cluster
+# keeps one document, preferring the papers themselves over reposts and then
+# the longest text; the clusters go to DEDUP_CLUSTERS.
+#
+# With 128 values in 32 bands of 4, a pair at Jaccard 0.8 shares a band with
+# probability ~1.0, one at 0.5 with ~0.87, and one at 0.2 with ~0.05.
+PRIME = (1 << 31) - 1
+WORD = re.compile(r"\w+")
+BLOCK = 4096   # shingles per step, bounds the (perm x shingles) temporary
+PRIMARY_SOURCES = {"pubmed", "semantic_scholar"}
+
+
+def shingle_hashes(text, size=SHINGLE_SIZE):
+    words = np.array([zlib.crc32(w.encode()) for w in WORD.findall(text.lower())], dtype=np.uint64)
+    if len(words) == 0:
+        return words
+    if len(words) < size:
+        size = len(words)
+    # polynomial hash of each run of `size` word hashes; uint64 wraps, which is fine for hashing
+    h = np.zeros(len(words) - size + 1, dtype=np.uint64)
+    for j in range(size):
+        h = h * np.uint64(1000003) + words[j:len(words) - size + 1 + j]
+    return np.unique(h % np.uint64(PRIME))
+
+
+class MinHasher:
+    def __init__(self, num_perm=MINHASH_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, PRIME, num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.integers(0, PRIME, num_perm, dtype=np.uint64)[:, None]
+        self.num_perm = num_perm
+
+    def signature(self, shingles):
+        sig = np.full(self.num_perm, PRIME, dtype=np.uint64)
+        for start in range(0, len(shingles), BLOCK):
+            x = shingles[start:start + BLOCK][None, :]
+            # a, b, x < 2^31, so a * x + b stays below 2^63
+            np.minimum(sig, ((self.a * x + self.b) % np.uint64(PRIME)).min(axis=1), out=sig)
+        return sig
+
+
+def candidate_pairs(signatures, bands):
+    # -> set of (i, j) that agree on every row of at least one band
+    rows = signatures.shape[1] // bands
+    pairs = set()
+    for band in range(bands):
+        block = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        keys = block.view(np.dtype((np.void, block.dtype.itemsize * rows))).ravel()
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        for s, e in zip(starts, ends):
+            if e - s < 2:
+                continue
+            members = order[s:e]
+            if e - s <= 50:
+                pairs.update((int(i), int(j)) for k, i in enumerate(members) for j in members[k + 1:])
+            else:
+                # a huge bucket (boilerplate pages) would be quadratic; link everyone to its first member
+                pairs.update((int(members[0]), int(j)) for j in members[1:])
+    return pairs
+
+
+class UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        self.parent[self.find(i)] = self.find(j)
+
+
+def cluster(signatures, bands=LSH_BANDS, threshold=NEAR_DUP_THRESHOLD):
+    # -> ({root: [member, ...]} for clusters of two or more, {(i, j): similarity}, candidate count)
+    pairs = candidate_pairs(signatures, bands)
+    uf = UnionFind(len(signatures))
+    similar = {}
+    for i, j in pairs:
+        similarity = float(np.mean(signatures[i] == signatures[j]))
+        if similarity >= threshold:
+            similar[(i, j)] = similarity
+            uf.union(i, j)
+    groups = {}
+    for i in range(len(signatures)):
+        groups.setdefault(uf.find(i), []).append(i)
+    return {root: members for root, members in groups.items() if len(members) > 1}, similar, len(pairs)
+
+
+def deduplicate(raw_dir=RAW_DIR, output_dir=CANONICAL_DIR, clusters_path=DEDUP_CLUSTERS, num_perm=MINHASH_PERM,
+                bands=LSH_BANDS, threshold=NEAR_DUP_THRESHOLD, shingle_size=SHINGLE_SIZE):
+    if num_perm % bands:
+        raise SystemExit(f"{num_perm} permutations do not split into {bands} bands")
+    start = time.perf_counter()
+    hasher = MinHasher(num_perm)
+    docs, signatures = [], []
+    for doc in latest_documents(raw_dir):
+        docs.append(doc)
+        signatures.append(hasher.signature(shingle_hashes(doc["text"], shingle_size)))
+    if not docs:
+        raise SystemExit(f"No documents in {raw_dir}")
+    signatures = np.vstack(signatures)
+    signed = time.perf_counter()
+    clusters, similar, candidates = cluster(signatures, bands, threshold)
+
+    dropped = set()
+    os.makedirs(os.path.dirname(clusters_path) or ".", exist_ok=True)
+    with open(clusters_path, "w", encoding="utf-8") as out:
+        for members in clusters.values():
+            keep = max(members, key=lambda i: (docs[i]["source"] in PRIMARY_SOURCES, len(docs[i]["text"]), -i))
+            duplicates = [i for i in members if i != keep]
+            dropped.update(duplicates)
+            out.write(json.dumps({
+                "canonical": docs[keep]["key"], "source": docs[keep]["source"],
+                "duplicates": [{"key": docs[i]["key"], "source": docs[i]["source"],
+                                "similarity": round(float(np.mean(signatures[keep] == signatures[i])), 3)}
+                               for i in duplicates],
+            }, ensure_ascii=False) + "\n")
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, "canonical.jsonl")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as out:
+        for i, doc in enumerate(docs):
+            if i not in dropped:
+                out.write(json.dumps(doc, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+
+    words_in = sum(len(doc["text"].split()) for doc in docs)
+    words_out = sum(len(doc["text"].split()) for i, doc in enumerate(docs) if i not in dropped)
+    return {
+        "docs": len(docs), "canonical": len(docs) - len(dropped), "clusters": len(clusters),
+        "duplicates_removed": len(dropped), "candidate_pairs": candidates, "similar_pairs": len(similar),
+        "words_in": words_in, "words_out": words_out,
+        "signature_seconds": round(signed - start, 2),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drop near-duplicate documents before indexing (MinHash + LSH)")
+    parser.add_argument("--raw-dir", default=RAW_DIR)
+    parser.add_argument("--output-dir", default=CANONICAL_DIR, help="where canonical.jsonl is written")
+    parser.add_argument("--clusters", default=DEDUP_CLUSTERS)
+    parser.add_argument("--threshold", type=float, default=NEAR_DUP_THRESHOLD, help="estimated Jaccard to count as duplicate")
+    parser.add_argument("--num-perm", type=int, default=MINHASH_PERM)
+    parser.add_argument("--bands", type=int, default=LSH_BANDS)
+    parser.add_argument("--shingle-size", type=int, default=SHINGLE_SIZE, help="words per shingle")
+    args = parser.parse_args()
+
+    stats = deduplicate(args.raw_dir, args.output_dir, args.clusters, args.num_perm, args.bands, args.threshold,
+                        args.shingle_size)
+    print(json.dumps(stats, indent=2))
+    print(f"Index the canonical set with: python build_index.py --raw-dir {args.output_dir} --prune")
@@ -0,0 +1,86 @@
+import argparse, json, time
+import numpy as np
+from config import TOP_K, RERANK_MODEL
+import retrieval
+
+# Offline retrieval quality: hit rate, precision and MRR at several k for each
+# retrieval mode. A query counts a chunk as relevant when the chunk belongs to
+# one of its relevant documents (document key or url).
+#
+# Labelled queries are JSONL: {"question": "...", "relevant": ["<url or key>", ...]}
+# Without them, --synthetic samples chunks and asks for a window of their own
+# words, which measures exact-term recall and flatters the lexical retriever.
+
+
+def doc_of(meta):
+    return meta.get("doc") or meta.get("url", "")
+
+
+def load_queries(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthetic_queries(n, words, rng):
+    metadata = retrieval.get_metadata()
+    queries = []
+    for idx in rng.choice(len(metadata), min(n, len(metadata)), replace=False):
+        meta = metadata[int(idx)]
+        tokens = meta.get("text", "").split()
+        if len(tokens) < words:
+            continue
+        start = int(rng.integers(0, len(tokens) - words + 1))
+        queries.append({"question": " ".join(tokens[start:start + words]), "relevant": [doc_of(meta)]})
+    return queries
+
+
+def evaluate(queries, mode, use_reranker, k_values, batch_size):
+    metadata = retrieval.get_metadata()
+    depth = max(k_values)
+    hit_at = {k: [] for k in k_values}
+    precision_at = {k: [] for k in k_values}
+    reciprocal_ranks, latencies = [], []
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start:start + batch_size]
+        began = time.perf_counter()
+        results = retrieval.retrieve([q["question"] for q in batch], depth, mode=mode, use_reranker=use_reranker)
+        latencies.append((time.perf_counter() - began) * 1000 / len(batch))
+        for query, found in zip(batch, results):
+            relevant = set(query["relevant"])
+            flags = [doc_of(metadata[hit["id"]]) in relevant for hit in found]
+            for k in k_values:
+                hit_at[k].append(any(flags[:k]))
+                precision_at[k].append(sum(flags[:k]) / k)
+            reciprocal_ranks.append(next((1 / (rank + 1) for rank, flag in enumerate(flags) if flag), 0.0))
+    row = {"mode": mode + ("+rerank" if use_reranker else "")}
+    for k in k_values:
+        row[f"hit@{k}"] = round(float(np.mean(hit_at[k])), 4)
+        row[f"p@{k}"] = round(float(np.mean(precision_at[k])), 4)
+    row[f"mrr@{depth}"] = round(float(np.mean(reciprocal_ranks)), 4)
+    row["ms_per_query"] = round(float(np.mean(latencies)), 2)
+    return row
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare dense, lexical and hybrid retrieval offline")
+    parser.add_argument("--queries", help="labelled queries JSONL")
+    parser.add_argument("--synthetic", type=int, default=200, help="sampled chunk queries when --queries is not given")
+    parser.add_argument("--words", type=int, default=12, help="words per synthetic query")
+    parser.add_argument("--k", default=f"1,3,5,{TOP_K}", help="comma separated cutoffs")
+    parser.add_argument("--modes", default="dense,lexical,hybrid")
+    parser.add_argument("--rerank", action="store_true", help=f"also score hybrid+rerank ({RERANK_MODEL or 'set RERANK_MODEL'})")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    retrieval.warmup()
+    queries = load_queries(args.queries) if args.queries else synthetic_queries(args.synthetic, args.words, np.random.default_rng(0))
+    k_values = sorted({int(k) for k in args.k.split(",")})
+    if retrieval.get_lexical() is None:
+        raise SystemExit("No lexical index, run build_index.py or lexical.py first")
+    if args.rerank and not RERANK_MODEL:
+        raise SystemExit("--rerank needs RERANK_MODEL")
+
+    print(f"queries: {len(queries)}")
+    runs = [(mode, False) for mode in args.modes.split(",")] + ([("hybrid", True)] if args.rerank else [])
+    for mode, use_reranker in runs:
+        print(json.dumps(evaluate(queries, mode, use_reranker, k_values, args.batch_size)))
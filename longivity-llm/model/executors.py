@@ -0,0 +1,28 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorBusy(Exception):
+    pass
+
+
+# Thread pool for blocking work that refuses new jobs once max_pending are
+# queued or running, so overload turns into fast 503s instead of a growing queue.
+class BoundedExecutor:
+    def __init__(self, max_workers, max_pending, name="compute"):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.max_pending = max_pending
+        self.pending = 0
+
+    async def run(self, fn, *args):
+        # only touched from the event loop thread, so no lock is needed
+        if self.pending >= self.max_pending:
+            raise ExecutorBusy(f"{self.pending} jobs already pending")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,100 @@
+import json, os, re, sqlite3, sys, threading
+
+# BM25 over the chunk store, backed by a SQLite FTS5 table whose rowid is the
+# chunk id, so lexical and FAISS hits name the same chunks. Porter stemming
+# lets "supplements" match "supplement"; numbers and tokens like "500mg" or a
+# PMID match exactly, which the dense index tends to miss.
+STOPWORDS = set("""a an and are as at be by can do does for from how i in is it my of on or should
+that the this to was what when which who why will with you your""".split())
+
+
+def match_query(text):
+    # FTS5 syntax is not safe for free text; quote each term and OR them
+    terms = [t for t in re.findall(r"\w+", text.lower()) if t not in STOPWORDS]
+    return " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+
+
+class LexicalIndex:
+    def __init__(self, path, readonly=False):
+        self.path = path
+        if readonly:
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(path)
+            self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(text, tokenize='porter unicode61')")
+            self.conn.commit()
+        # compute threads share the read-only connection
+        self.lock = threading.Lock()
+
+    def add(self, ids, texts):
+        self.conn.executemany("INSERT INTO chunks (rowid, text) VALUES (?, ?)", zip(map(int, ids), texts))
+
+    def remove(self, ids):
+        self.conn.executemany("DELETE FROM chunks WHERE rowid = ?", [(int(i),) for i in ids])
+
+    def truncate(self, count):
+        # drop chunks written after the last checkpoint
+        self.conn.execute("DELETE FROM chunks WHERE rowid >= ?", (count,))
+
+    def commit(self):
+        self.conn.commit()
+
+    def optimize(self):
+        self.conn.execute("INSERT INTO chunks (chunks) VALUES ('optimize')")
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def search(self, text, k):
+        # (chunk id, score) best first; bm25() is lower-is-better, so negate it
+        query = match_query(text)
+        if not query:
+            return []
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT rowid, bm25(chunks) FROM chunks WHERE chunks MATCH ? ORDER BY rank LIMIT ?", (query, k)
+            ).fetchall()
+        return [(rowid, -score) for rowid, score in rows]
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(path)
+
+
+def build(store, ids, path):
+    # (re)index the given chunk ids from a ChunkStore
+    index = LexicalIndex(path)
+    index.conn.execute("DELETE FROM chunks")
+    batch = []
+    for i in ids:
+        batch.append((i, store[i].get("text", "")))
+        if len(batch) >= 10000:
+            index.add(*zip(*batch))
+            batch = []
+    if batch:
+        index.add(*zip(*batch))
+    index.commit()
+    index.optimize()
+    count = len(index)
+    index.close()
+    return count
+
+
+if __name__ == "__main__":
+    # one-off backfill for indexes built before the lexical index existed
+    from config import CHUNK_STORE, INGEST_DB, LEXICAL_DB
+    from chunk_store import ChunkStore
+    path = sys.argv[1] if len(sys.argv) > 1 else LEXICAL_DB
+    store = ChunkStore(CHUNK_STORE)
+    if os.path.exists(INGEST_DB):
+        # only chunks still referenced by a document; replaced ones stay in the store
+        manifest = sqlite3.connect(INGEST_DB)
+        ids = sorted(i for (chunk_ids,) in manifest.execute("SELECT chunk_ids FROM docs") for i in json.loads(chunk_ids))
+    else:
+        ids = range(len(store))
+    print(f"Indexed {build(store, ids, path)} chunks → {path}")
@@ -0,0 +1,68 @@
+import argparse, asyncio, time
+from collections import Counter
+import httpx
+import numpy as np
+
+# Fires concurrent requests at a running server and reports throughput and
+# latency. Run it against the old and new server builds to compare.
+PAYLOADS = {
+    "/ask": {"question": "What supplements improve sleep quality?", "k": 5},
+    "/nutrition": {"goal": "weight_loss", "override_profile": {"age": 35, "weight": 80, "height": 178}},
+}
+
+
+async def streamed(client, path, payload, first_tokens):
+    # time-to-first-token: until the first {"token": ...} frame arrives
+    start, first = time.perf_counter(), None
+    async with client.stream("POST", path, json={**payload, "stream": True}) as res:
+        async for line in res.aiter_lines():
+            if first is None and line.startswith('{"token"'):
+                first = time.perf_counter() - start
+    if first is not None:
+        first_tokens.append(first)
+    return res
+
+
+async def worker(client, path, payload, deadline, latencies, statuses, first_tokens, stream):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            res = await (streamed(client, path, payload, first_tokens) if stream else client.post(path, json=payload))
+            statuses[res.status_code] += 1
+        except httpx.HTTPError as e:
+            statuses[type(e).__name__] += 1
+        latencies.append(time.perf_counter() - start)
+
+
+async def main(args):
+    latencies, statuses, first_tokens = [], Counter(), []
+    payload = PAYLOADS[args.path]
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*[
+            worker(client, args.path, payload, deadline, latencies, statuses, first_tokens, args.stream)
+            for _ in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies) * 1000
+    print(f"{args.path} x{args.concurrency} for {elapsed:.1f}s")
+    print(f"requests: {len(lat)}  throughput: {len(lat) / elapsed:.1f} req/s")
+    print(f"latency ms  p50: {np.percentile(lat, 50):.0f}  p95: {np.percentile(lat, 95):.0f}  p99: {np.percentile(lat, 99):.0f}")
+    if first_tokens:
+        ttft = np.array(first_tokens) * 1000
+        print(f"first token ms  p50: {np.percentile(ttft, 50):.0f}  p95: {np.percentile(ttft, 95):.0f}")
+    print("statuses:", dict(statuses))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", choices=sorted(PAYLOADS), default="/ask")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--stream", action="store_true", help="use the streaming mode and report time to first token")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,86 @@
+import json
+import httpx
+from config import OLLAMA_HOST, OLLAMA_MODEL, OLLAMA_TIMEOUT, OLLAMA_KEEP_ALIVE
+
+
+class OllamaError(Exception):
+    pass
+
+
+def ndjson(frame):
+    return json.dumps(frame, ensure_ascii=False) + "\n"
+
+
+async def relay(frames, tokens, on_complete=None):
+    # Streams the leading frames (citations) straight away, then one frame per
+    # generated piece of text, then a final done/error frame.
+    for frame in frames:
+        yield ndjson(frame)
+    pieces = []
+    try:
+        async for token in tokens:
+            pieces.append(token)
+            yield ndjson({"token": token})
+    except (OllamaError, httpx.HTTPError) as e:
+        yield ndjson({"error": str(e)})
+        return
+    if on_complete:
+        on_complete("".join(pieces))
+    yield ndjson({"done": True})
+
+
+async def replay(text):
+    yield text
+
+
+# The system prompt is sent separately from the per-request prompt so every
+# request starts with the same tokens; with the model kept loaded (keep_alive)
+# Ollama can reuse the KV cache for that prefix instead of re-running prefill.
+# bench_prefix.py puts the gain over the old single prompt at a few percent of
+# prompt tokens, and alternating /ask and /nutrition on one cache slot loses it.
+class OllamaClient:
+    def __init__(self, host=OLLAMA_HOST, model=OLLAMA_MODEL, timeout=OLLAMA_TIMEOUT, max_connections=32,
+                 keep_alive=OLLAMA_KEEP_ALIVE):
+        self.model = model
+        self.keep_alive = keep_alive
+        self.http = httpx.AsyncClient(
+            base_url=host,
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def payload(self, prompt, system=None, stream=False):
+        body = {"model": self.model, "prompt": prompt, "stream": stream, "keep_alive": self.keep_alive}
+        if system:
+            body["system"] = system
+        return body
+
+    async def warm(self):
+        # load the model before the first request
+        try:
+            await self.http.post("/api/generate", json={"model": self.model, "keep_alive": self.keep_alive})
+        except httpx.HTTPError as e:
+            print(f"⚠️ Could not warm {self.model}: {e}")
+
+    async def generate(self, prompt, system=None):
+        return await self.http.post("/api/generate", json=self.payload(prompt, system))
+
+    async def stream(self, prompt, system=None):
+        # yields response text pieces as Ollama produces them
+        payload = self.payload(prompt, system, stream=True)
+        async with self.http.stream("POST", "/api/generate", json=payload) as res:
+            if res.status_code != 200:
+                raise OllamaError(f"Ollama returned {res.status_code}: {(await res.aread()).decode(errors='replace')}")
+            async for line in res.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise OllamaError(chunk["error"])
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    break
+
+    async def aclose(self):
+        await self.http.aclose()
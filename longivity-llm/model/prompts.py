@@ -0,0 +1,30 @@
+# Static instructions go in Ollama's `system` field and never change between
+# requests, so they form an identical token prefix that Ollama can keep in its
+# KV cache; everything request-specific goes in the prompt after it.
+
+NUTRITION_SYSTEM = """You are a personal health coach. Each request gives you a user's goal, their profile, recent activity data (latest day plus 7- and 30-day daily averages) and relevant expert information from a knowledge base.
+
+Based on all this information, give a complete personalized nutrition plan (with meals, timing, supplements) that fits the goal and user constraints. Cite knowledge base entries by their [number] where you rely on them."""
+
+ASK_SYSTEM = """You are a longevity assistant. Answer the user's question using only the numbered context that comes with it, and cite entries by their [number]. If the context does not cover the question, say so."""
+
+
+def nutrition_prompt(profile, intraday, context, goal) -> str:
+    profile_text = '\n'.join([f"{k.capitalize()}: {v}" for k, v in profile.items()])
+    activity_text = '\n'.join([f"{k}: {v}" for k, v in intraday.items()])
+    rag_text = '\n'.join(context)
+    return f"""User Goal: {goal}
+
+User Profile:
+{profile_text}
+
+Recent Activity:
+{activity_text}
+
+Knowledge Base:
+{rag_text}
+"""
+
+
+def ask_prompt(context, question) -> str:
+    return f"Context:\n{context}\n\nUser question: {question}\n\nAnswer:"
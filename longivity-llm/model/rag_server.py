@@ -1,69 +1,114 @@
-import json, faiss, numpy as np, uvicorn, os
-from pathlib import Path
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-import requests
-from sentence_transformers import SentenceTransformer
-
-EMBED_MODEL  = "nomic-ai/nomic-embed-text-v1"
-INDEX_FILE   = "../data/faiss_index/index.faiss"
-META_FILE    = "../data/faiss_index/metadata.json"
-TOP_K        = 8                        
-OLLAMA_HOST  = os.getenv("OLLAMA_HOST", "http://localhost:11434")
-OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")  
-
-index = faiss.read_index(INDEX_FILE)
-with open(META_FILE, encoding="utf-8") as f:
-    metadata = json.load(f)
-
-embedder = SentenceTransformer(EMBED_MODEL, trust_remote_code=True)
+from config import (COMPUTE_WORKERS, COMPUTE_MAX_PENDING, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL,
+                    ANSWER_CACHE_THRESHOLD, EMBED_MODEL, TOP_K,
+                    BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, BATCH_MAX_QUEUED)
+from answer_cache import AnswerCache
+from batcher import MicroBatcher
+from prompts import ASK_SYSTEM, ask_prompt
+from context_packer import pack_snippets, context_blocks, estimate_tokens, remaining_budget
+from executors import BoundedExecutor, ExecutorBusy
+from ollama_client import OllamaClient, relay, replay
+import retrieval
+
+# embedding + FAISS search run on `compute` so they never block the event loop
+compute = None
+ollama = None
+# concurrent questions share one encode and one index.search
+embedder = None
+searcher = None
+answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD)
+
+@asynccontextmanager
+async def lifespan(app):
+    global compute, ollama, embedder, searcher
+    compute = BoundedExecutor(COMPUTE_WORKERS, COMPUTE_MAX_PENDING)
+    ollama = OllamaClient()
+    embedder = MicroBatcher(retrieval.embed, compute, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, BATCH_MAX_QUEUED, "embed")
+    searcher = MicroBatcher(retrieval.search_batch, compute, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, BATCH_MAX_QUEUED, "search")
+    await compute.run(retrieval.warmup)
+    await ollama.warm()
+    yield
+    await embedder.aclose()
+    await searcher.aclose()
+    await ollama.aclose()
+    compute.shutdown()
 
 # ---------- FastAPI ----------
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+@app.exception_handler(ExecutorBusy)
+async def executor_busy(request: Request, exc: ExecutorBusy):
+    return JSONResponse(status_code=503, content={"error": "Server busy, retry shortly."}, headers={"Retry-After": "1"})
 
 class Query(BaseModel):
     question: str
     k: int | None = None   # allow override
+    stream: bool = False   # NDJSON frames: citations, then tokens, then done
+    nprobe: int | None = None      # IVF lists probed (ivf_flat / ivf_pq indexes)
+    ef_search: int | None = None   # HNSW candidate list size (hnsw indexes)
+
+def cache_fingerprint():
+    # the index version is taken when it loads, so a cache hit costs no file system call
+    return (EMBED_MODEL, ollama.model, ASK_SYSTEM, retrieval.index_version())
 
-def embed(texts: list[str]) -> np.ndarray:
-    vectors = embedder.encode(texts, batch_size=16, normalize_embeddings=True)
-    return np.asarray(vectors, dtype="float32")
+def cached_response(hit, stream):
+    if stream:
+        frames = [{"citations": hit["citations"]}]
+        return StreamingResponse(relay(frames, replay(hit["answer"])), media_type="application/x-ndjson")
+    return hit
+
+@app.get("/retrieval/stats")
+def retrieval_stats():
+    return retrieval.stats()
+
+@app.get("/batching/stats")
+def batching_stats():
+    return {"embed": embedder.stats(), "search": searcher.stats()}
+
+@app.get("/cache/stats")
+def cache_stats():
+    return answer_cache.stats()
 
 @app.post("/ask")
-def ask(q: Query):
+async def ask(q: Query):
     print("🔍 Received query:", q.question)
 
-    vec = embed([q.question])
-    print("✅ Embedded query")
-
     k = q.k or TOP_K
-    D, I = index.search(vec, k)
-    print("🔎 FAISS search done. Indices:", I[0])
-
-    ctx_blocks = []
-    for rank, idx in enumerate(I[0]):
-        print(f"📄 Getting metadata[{idx}]")
-        meta = metadata[idx]
-        snippet = meta.get("text", "").strip().replace("\n", " ")
-        ctx_blocks.append(f"[{rank+1}] {snippet}")
-    print("🧱 Prepared RAG context")
-
-    system_prompt = (
-        "You are a longevity assistant. Use only the following context:\n\n"
-        f"{'\n'.join(ctx_blocks)}\n\n"
-        f"User question: {q.question}\n\nAnswer:"
-    )
-    print("🧠 Prompt ready, calling Ollama...")
-
-    res = requests.post(
-        f"{OLLAMA_HOST}/api/generate",
-        json={ "model": OLLAMA_MODEL, "prompt": system_prompt, "stream": False },
-        timeout=90
-    )
+    # an answer is only reused for a request that would retrieve the same chunks
+    params = (k, q.nprobe, q.ef_search, retrieval.retrieval_mode())
+    answer_cache.validate(cache_fingerprint())
+    hit = answer_cache.get_exact(q.question, params)
+    if hit is None:
+        vec = await embedder.submit(q.question)
+        hit = answer_cache.get_similar(vec, params)
+    if hit is not None:
+        print("♻️ Answer cache hit")
+        return cached_response(hit, q.stream)
+
+    results = await searcher.submit((q.question, vec, k, q.nprobe, q.ef_search))
+    print("🔎 Retrieval done. Indices:", [hit["id"] for hit in results])
+
+    packed = pack_snippets(q.question, results, remaining_budget(ASK_SYSTEM + ask_prompt("", q.question)))
+    ctx_blocks, citations = context_blocks(packed)
+    prompt = ask_prompt("\n".join(ctx_blocks), q.question)
+    prompt_tokens = estimate_tokens(ASK_SYSTEM + prompt)
+    print(f"🧠 Prompt ready ({prompt_tokens} tokens, {len(packed)}/{len(results)} chunks), calling Ollama...")
+
+    def remember(answer):
+        answer_cache.put(q.question, params, vec, {"answer": answer.strip(), "citations": citations})
+
+    if q.stream:
+        frames = [{"citations": citations, "prompt_tokens": prompt_tokens}]
+        tokens = ollama.stream(prompt, system=ASK_SYSTEM)
+        return StreamingResponse(relay(frames, tokens, on_complete=remember), media_type="application/x-ndjson")
+
+    res = await ollama.generate(prompt, system=ASK_SYSTEM)
     print("📨 Ollama replied!")
 
     ollama_json = res.json()
-    print("📦 Ollama raw JSON:", ollama_json)
 
     if "response" not in ollama_json:
         return {
@@ -72,11 +117,15 @@ def ask(q: Query):
         }
 
     reply = ollama_json["response"]
+    remember(reply)
 
     return {
         "answer": reply.strip(),
-        "citations": [
-            {"rank": i+1, "source": metadata[idx]["source"], "url": metadata[idx].get("url", "")}
-            for i, idx in enumerate(I[0])
-        ]
+        "citations": citations,
+        "prompt_tokens": prompt_tokens,
+        "prompt_eval_count": ollama_json.get("prompt_eval_count"),
     }
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, port=8000)
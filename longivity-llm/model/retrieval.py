@@ -0,0 +1,209 @@
+import json, os, resource, threading, time
+import numpy as np
+from config import (EMBED_MODEL, INDEX_FILE, META_FILE, CHUNK_STORE, TOP_K, FAISS_MMAP, LEXICAL_DB,
+                    RETRIEVAL_MODE, HYBRID_CANDIDATES, RRF_K, RERANK_MODEL, RERANK_CANDIDATES)
+from chunk_store import ChunkStore
+from lexical import LexicalIndex
+import ann
+
+# Embedder, index and metadata are loaded on first use, once per process, and
+# shared by every server that imports this module.
+_lock = threading.Lock()
+_embedder = None
+_index = None
+_index_version = None
+_metadata = None
+_lexical = None
+_reranker = None
+load_seconds = {}
+
+
+def _timed(name, load):
+    start = time.perf_counter()
+    value = load()
+    load_seconds[name] = round(time.perf_counter() - start, 3)
+    return value
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        with _lock:
+            if _embedder is None:
+                from sentence_transformers import SentenceTransformer
+                _embedder = _timed("embedder", lambda: SentenceTransformer(EMBED_MODEL, trust_remote_code=True))
+    return _embedder
+
+
+def get_index():
+    global _index, _index_version
+    if _index is None:
+        with _lock:
+            if _index is None:
+                import faiss
+                flags = faiss.IO_FLAG_MMAP if FAISS_MMAP else 0
+                stat = os.stat(INDEX_FILE)
+                index = _timed("index", lambda: faiss.read_index(INDEX_FILE, flags))
+                _index_version = (index.ntotal, stat.st_size, stat.st_mtime_ns)
+                _index = index
+    return _index
+
+
+def index_version():
+    # (vectors, file size, mtime) of the index file as it was when loaded
+    get_index()
+    return _index_version
+
+
+def get_metadata():
+    global _metadata
+    if _metadata is None:
+        with _lock:
+            if _metadata is None:
+                def load():
+                    if ChunkStore.exists(CHUNK_STORE):
+                        return ChunkStore(CHUNK_STORE)
+                    with open(META_FILE, encoding="utf-8") as f:
+                        return json.load(f)
+                _metadata = _timed("metadata", load)
+    return _metadata
+
+
+def get_lexical():
+    # None when the BM25 index has not been built, retrieval is then dense only
+    global _lexical
+    if _lexical is None and LexicalIndex.exists(LEXICAL_DB):
+        with _lock:
+            if _lexical is None:
+                _lexical = _timed("lexical", lambda: LexicalIndex(LEXICAL_DB, readonly=True))
+    return _lexical
+
+
+def get_reranker():
+    global _reranker
+    if _reranker is None:
+        with _lock:
+            if _reranker is None:
+                from sentence_transformers import CrossEncoder
+                _reranker = _timed("reranker", lambda: CrossEncoder(RERANK_MODEL))
+    return _reranker
+
+
+def warmup():
+    get_embedder(), get_index(), get_metadata(), get_lexical()
+    if RERANK_MODEL:
+        get_reranker()
+    return stats()
+
+
+def embed(texts: list[str]) -> np.ndarray:
+    vectors = get_embedder().encode(texts, batch_size=16, normalize_embeddings=True)
+    return np.asarray(vectors, dtype="float32")
+
+
+def search(vectors: np.ndarray, k: int = TOP_K, nprobe: int | None = None,
+           ef_search: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+    # nprobe / ef_search only apply to IVF / HNSW indexes, None means the config default
+    index = get_index()
+    params = ann.search_params(index, nprobe, ef_search)
+    return index.search(vectors, k, params=params) if params is not None else index.search(vectors, k)
+
+
+def hits(scores, ids) -> list[dict]:
+    metadata = get_metadata()
+    results = []
+    for rank, (score, idx) in enumerate(zip(scores, ids)):
+        if idx < 0:
+            continue
+        meta = metadata[idx]
+        results.append({
+            "rank": rank + 1,
+            "id": int(idx),
+            "score": float(score),
+            "text": meta.get("text", ""),
+            "source": meta.get("source", ""),
+            "url": meta.get("url", ""),
+        })
+    return results
+
+
+def rrf(rankings: list[list[tuple]], k: int, rrf_k: int = RRF_K) -> list[tuple]:
+    # reciprocal rank fusion: only ranks matter, so BM25 and cosine scores
+    # never have to be put on the same scale
+    scores = {}
+    for ranking in rankings:
+        for rank, (idx, _) in enumerate(ranking):
+            scores[idx] = scores.get(idx, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores.items(), key=lambda item: -item[1])[:k]
+
+
+def rerank(pairs: list[tuple[str, list[tuple]]], k_values: list[int]) -> list[list[tuple]]:
+    # one cross-encoder pass over every (query, candidate) pair in the batch
+    metadata = get_metadata()
+    inputs = [(text, metadata[idx].get("text", "")) for text, ranked in pairs for idx, _ in ranked]
+    scores = iter(get_reranker().predict(inputs, batch_size=32) if inputs else [])
+    results = []
+    for (_, ranked), k in zip(pairs, k_values):
+        rescored = [(idx, float(next(scores))) for idx, _ in ranked]
+        results.append(sorted(rescored, key=lambda item: -item[1])[:k])
+    return results
+
+
+def retrieval_mode(mode: str | None = None) -> str:
+    # the mode search_batch will actually run: without a lexical index everything is dense
+    mode = mode or RETRIEVAL_MODE
+    return mode if mode == "dense" or get_lexical() is not None else "dense"
+
+
+def search_batch(requests: list[tuple], mode: str | None = None, use_reranker: bool | None = None) -> list[list[dict]]:
+    # requests are (text, vector, k, nprobe, ef_search). One index.search per
+    # distinct nprobe / ef_search at the largest depth asked for, then BM25
+    # per query, fused by RRF and optionally re-ranked.
+    mode = retrieval_mode(mode)
+    use_reranker = bool(RERANK_MODEL) if use_reranker is None else use_reranker
+
+    def depth(k):
+        # fusion and re-ranking need a deeper candidate list than the k returned
+        return k if mode == "dense" and not use_reranker else max(k, HYBRID_CANDIDATES)
+
+    dense = [[] for _ in requests]
+    if mode != "lexical":
+        groups = {}
+        for i, (_, _, _, nprobe, ef_search) in enumerate(requests):
+            groups.setdefault((nprobe, ef_search), []).append(i)
+        for (nprobe, ef_search), rows in groups.items():
+            D, I = search(np.vstack([requests[i][1] for i in rows]), max(depth(requests[i][2]) for i in rows), nprobe, ef_search)
+            for row, i in enumerate(rows):
+                dense[i] = [(int(idx), float(score)) for score, idx in zip(D[row], I[row]) if idx >= 0]
+
+    ranked = []
+    for i, (text, _, k, _, _) in enumerate(requests):
+        if mode == "dense":
+            ranked.append(dense[i])
+        elif mode == "lexical":
+            ranked.append(get_lexical().search(text, depth(k)))
+        else:
+            ranked.append(rrf([dense[i], get_lexical().search(text, depth(k))], depth(k)))
+    if use_reranker:
+        pairs = [(text, candidates[:RERANK_CANDIDATES]) for (text, *_), candidates in zip(requests, ranked)]
+        ranked = rerank(pairs, [request[2] for request in requests])
+    return [hits([score for _, score in r[:request[2]]], [idx for idx, _ in r[:request[2]]])
+            for request, r in zip(requests, ranked)]
+
+
+def retrieve(queries: list[str], k: int = TOP_K, nprobe=None, ef_search=None, **options) -> list[list[dict]]:
+    # one encode and one index.search for the whole batch of queries
+    vectors = embed(queries)
+    return search_batch([(text, vectors[i], k, nprobe, ef_search) for i, text in enumerate(queries)], **options)
+
+
+def stats() -> dict:
+    return {
+        "load_seconds": dict(load_seconds),
+        "index_vectors": _index.ntotal if _index is not None else None,
+        "index": ann.describe(_index) if _index is not None else None,
+        "index_mmap": FAISS_MMAP,
+        "retrieval_mode": RETRIEVAL_MODE if _lexical is not None else "dense",
+        "reranker": RERANK_MODEL or None,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
@@ -1,7 +1,6 @@
-import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse
-import time, json, os
+import os
+from crawl_engine import PageListSite, crawl
 
 class WebScraper:
     def __init__(self, source_file, output_dir, delay=1.0):
@@ -24,39 +23,10 @@ class WebScraper:
                 tasks[domain].append(url)
         return tasks
 
-    def fetch(self, url):
-        try:
-            print(f"Fetching: {url}")
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            return response.text
-        except Exception as e:
-            print(f"Error fetching {url}: {e}")
-            return None
-
-    def parse_html(self, html):
-        soup = BeautifulSoup(html, "html.parser")
-        for tag in soup(["script", "style", "nav", "footer", "form"]):
-            tag.decompose()
-        text = soup.get_text(separator="\n").strip()
-        return text
-
     def scrape(self):
-        for domain, urls in self.tasks.items():
-            output_path = os.path.join(self.output_dir, f"{domain}.jsonl")
-            with open(output_path, "w", encoding="utf-8") as out:
-                for url in urls:
-                    html = self.fetch(url)
-                    if html:
-                        clean_text = self.parse_html(html)
-                        record = {
-                            "source": domain,
-                            "url": url,
-                            "text": clean_text
-                        }
-                        out.write(json.dumps(record, ensure_ascii=False) + "\n")
-                        time.sleep(self.delay)
-            print(f"✅ Scraped {len(urls)} pages → {output_path}")
+        # one site per domain, so domains are fetched in parallel and each at most every `delay` seconds
+        sites = [PageListSite(domain, urls) for domain, urls in self.tasks.items()]
+        return crawl(sites, output_dir=self.output_dir, delay=self.delay)
 
 if __name__ == "__main__":
     scraper = WebScraper(
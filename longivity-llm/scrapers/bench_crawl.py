@@ -0,0 +1,95 @@
+import argparse, json, os, tempfile, threading, time, zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from crawl_engine import ListingSite, crawl
+
+# Crawls local fixture sites (one server per "domain") shaped like the
+# sources.txt archives, sequentially and through the concurrent engine.
+# Every response takes --latency-ms, standing in for a remote site. A third
+# pair of runs re-crawls with a crawl state after --edit posts per site changed,
+# which should append only those posts and answer the rest with 304s.
+WORDS = "longevity protein sleep fasting glucose creatine omega vitamin exercise heart".split()
+
+
+def fixture_site(pages, per_page, latency, robots="User-agent: *\nDisallow: /private/\n"):
+    edited = set()   # paths whose text has changed since the first crawl
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            if self.path == "/robots.txt":
+                body = robots
+            elif self.path.startswith("/blog/"):
+                page = int(self.path.split("/")[-1] or 1)
+                links = "".join(f'<h2 class="entry-title"><a href="/post/{page}-{i}">Post</a></h2>' for i in range(per_page))
+                nxt = f'<a class="next page-numbers" href="/blog/{page + 1}">Next</a>' if page < pages else ""
+                body = f"<html><body>{links}<a href='/private/x'>x</a>{nxt}</body></html>"
+            elif self.path.startswith("/post/"):
+                seed = zlib.crc32(self.path.encode()) + (7 if self.path in edited else 0)
+                text = " ".join(WORDS[(seed + i * i) % len(WORDS)] for i in range(200))
+                body = f"<html><body><nav>menu</nav><div class='entry-content'><p>{text}</p></div></body></html>"
+            else:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            data = body.encode()
+            etag = f'"{zlib.crc32(data):08x}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.edited = edited
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sequential vs concurrent crawl of local fixture sites")
+    parser.add_argument("--sites", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=3, help="listing pages per site")
+    parser.add_argument("--per-page", type=int, default=10, help="articles per listing page")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--delay", type=float, default=0.05, help="per-domain politeness gap")
+    parser.add_argument("--per-domain", type=int, default=2)
+    parser.add_argument("--edit", type=int, default=3, help="posts per site changed before the re-crawl")
+    args = parser.parse_args()
+
+    servers = [fixture_site(args.pages, args.per_page, args.latency_ms / 1000) for _ in range(args.sites)]
+    configs = [{"name": f"fixture_{i}", "base_url": f"http://127.0.0.1:{s.server_port}", "start_page": "/blog/1",
+                "article_selector": ".entry-content", "article_link_selector": "h2.entry-title a",
+                "next_selector": ".next.page-numbers"} for i, s in enumerate(servers)]
+    options = {"per_domain": args.per_domain, "delay": args.delay}
+    runs = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # one request at a time, the way the old scrapers ran
+        runs["sequential"] = crawl([ListingSite(c) for c in configs], output_dir=os.path.join(tmp, "a"),
+                                   concurrency=1, per_domain=1, delay=args.delay, state=None)
+        runs["concurrent"] = crawl([ListingSite(c) for c in configs], output_dir=os.path.join(tmp, "b"), state=None, **options)
+        state, out = os.path.join(tmp, "state.db"), os.path.join(tmp, "c")
+        runs["first crawl"] = crawl([ListingSite(c) for c in configs], output_dir=out, state=state, **options)
+        for server in servers:
+            server.edited.update(f"/post/1-{i}" for i in range(args.edit))
+        # refresh_after=0 re-checks every article, conditionally
+        runs["re-crawl"] = crawl([ListingSite(c) for c in configs], output_dir=out, state=state, refresh_after=0, **options)
+        lines = sum(1 for name in os.listdir(out) for _ in open(os.path.join(out, name)))
+    for name, stats in runs.items():
+        print(f"{name:>11}: {stats['fetched']} pages ({stats['not_modified']} not modified), "
+              f"{sum(stats['records'].values())} records appended, {stats['seconds']}s")
+    print(f"speedup: {runs['sequential']['seconds'] / max(runs['concurrent']['seconds'], 0.1):.1f}x, "
+          f"{lines} JSONL lines after the re-crawl")
+    print(json.dumps(runs["re-crawl"]))
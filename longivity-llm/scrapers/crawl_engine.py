@@ -0,0 +1,310 @@
+import asyncio, hashlib, json, os, random, time
+from urllib.parse import urljoin, urlparse, urldefrag
+from urllib.robotparser import RobotFileParser
+import httpx
+from bs4 import BeautifulSoup
+from scraper_config import (USER_AGENTS, RAW_DIR, CRAWL_CONCURRENCY, CRAWL_PER_DOMAIN, CRAWL_DELAY,
+                            CRAWL_TIMEOUT, CRAWL_STATE_DB, CRAWL_REFRESH_AFTER)
+from crawl_state import CrawlState, DONE
+
+# Shared async crawler. Sites describe what to fetch and how to parse it; the
+# engine owns the frontier, one connection pool, politeness and output.
+#
+# Each domain has its own queue and CRAWL_PER_DOMAIN workers that leave at
+# least `delay` seconds between requests, so different domains are crawled in
+# parallel while no single one sees more than a trickle. Parsed records are
+# appended to <output_dir>/<site>.jsonl as soon as they are extracted.
+#
+# With a CrawlState (the default) runs are incremental: URLs left queued by an
+# interrupted run are picked up again, articles fetched within refresh_after are
+# not requested at all, everything else is re-requested conditionally, and a
+# record is only appended when its content hash changed. Later lines for a url
+# supersede earlier ones, so the indexer only re-embeds what actually changed.
+LISTING, ARTICLE, PAGE = "listing", "article", "page"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ListingSite:
+    # a paginated archive from sources.txt: listing pages link to articles and
+    # to the next listing page; article text comes from article_selector
+    def __init__(self, cfg):
+        self.name = cfg["name"]
+        self.base_url = cfg["base_url"]
+        self.cfg = cfg
+        self.min_chars = cfg.get("min_chars", 500)
+        self.max_records = cfg.get("max_articles")
+
+    def start(self):
+        return [(urljoin(self.base_url, self.cfg["start_page"]), LISTING)]
+
+    def parse(self, url, kind, html):
+        # -> (records, [(url, kind), ...])
+        soup = BeautifulSoup(html, "html.parser")
+        if kind == ARTICLE:
+            block = soup.select_one(self.cfg["article_selector"])
+            text = block.get_text(separator="\n").strip() if block else ""
+            return ([{"source": self.name, "url": url, "text": text}] if len(text) > self.min_chars else []), []
+        links = [(urljoin(url, a["href"]), ARTICLE) for a in soup.select(self.cfg["article_link_selector"]) if a.get("href")]
+        nxt = soup.select_one(self.cfg["next_selector"]) if self.cfg.get("next_selector") else None
+        if nxt is not None and nxt.name != "a":
+            nxt = nxt.find("a") or nxt
+        if nxt is not None and nxt.get("href"):
+            links.append((urljoin(url, nxt["href"]), LISTING))
+        return [], links
+
+
+class PageListSite:
+    # a fixed list of pages whose whole visible text is kept
+    def __init__(self, name, urls):
+        self.name = name
+        self.urls = urls
+        self.max_records = None
+
+    def start(self):
+        return [(url, PAGE) for url in self.urls]
+
+    def parse(self, url, kind, html):
+        soup = BeautifulSoup(html, "html.parser")
+        for tag in soup(["script", "style", "nav", "footer", "form"]):
+            tag.decompose()
+        return [{"source": self.name, "url": url, "text": soup.get_text(separator="\n").strip()}], []
+
+
+class Domain:
+    def __init__(self, host, delay):
+        self.host = host
+        self.delay = delay
+        self.queue = asyncio.Queue()
+        self.next_at = 0.0
+        self.lock = asyncio.Lock()
+        self.robots = None
+        self.robots_lock = asyncio.Lock()
+
+    async def wait_turn(self):
+        # spaces request starts `delay` apart across this domain's workers
+        async with self.lock:
+            now = time.monotonic()
+            wait = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.delay
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def back_off(self, seconds):
+        self.next_at = max(self.next_at, time.monotonic() + seconds)
+
+
+class CrawlEngine:
+    def __init__(self, sites, output_dir=RAW_DIR, concurrency=CRAWL_CONCURRENCY, per_domain=CRAWL_PER_DOMAIN,
+                 delay=CRAWL_DELAY, timeout=CRAWL_TIMEOUT, max_retries=3, respect_robots=True,
+                 state=CRAWL_STATE_DB, refresh_after=CRAWL_REFRESH_AFTER):
+        self.sites = sites
+        self.output_dir = output_dir
+        self.concurrency = concurrency
+        self.per_domain = per_domain
+        self.delay = delay
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.respect_robots = respect_robots
+        self.state = CrawlState(state) if isinstance(state, str) else state
+        self.refresh_after = refresh_after
+        self.domains = {}
+        self.seen = set()
+        self.pending = 0
+        self.idle = None
+        self.outputs = {}
+        self.records = {site.name: 0 for site in sites}
+        self.stats = {"fetched": 0, "failed": 0, "retried": 0, "robots_blocked": 0, "bytes": 0,
+                      "not_modified": 0, "unchanged": 0, "changed": 0, "skipped_fresh": 0, "resumed": 0}
+
+    # ---------- frontier ----------
+
+    def enqueue(self, site, url, kind):
+        url = urldefrag(url)[0]
+        if url in self.seen or urlparse(url).scheme not in ("http", "https"):
+            return
+        if site.max_records is not None and self.records[site.name] >= site.max_records:
+            return
+        self.seen.add(url)
+        if self.state is not None:
+            row = self.state.get(url)
+            if kind != LISTING and row and row["status"] in DONE and time.time() - row["fetched_at"] < self.refresh_after:
+                self.stats["skipped_fresh"] += 1
+                return
+            self.state.queue(url, site.name, kind)
+        host = urlparse(url).netloc
+        domain = self.domains.get(host)
+        if domain is None:
+            domain = self.domains[host] = Domain(host, self.delay)
+            self.workers += [asyncio.create_task(self.worker(domain)) for _ in range(self.per_domain)]
+        self.pending += 1
+        domain.queue.put_nowait((site, url, kind))
+
+    def done(self):
+        self.pending -= 1
+        if self.pending == 0:
+            self.idle.set()
+
+    # ---------- fetching ----------
+
+    async def allowed(self, domain, url):
+        if not self.respect_robots:
+            return True
+        async with domain.robots_lock:
+            if domain.robots is None:
+                robots = RobotFileParser()
+                try:
+                    res = await self.client.get(f"{urlparse(url).scheme}://{domain.host}/robots.txt")
+                    robots.parse(res.text.splitlines() if res.status_code == 200 else [])
+                except httpx.HTTPError:
+                    robots.parse([])
+                if robots.crawl_delay("*"):
+                    domain.delay = max(domain.delay, float(robots.crawl_delay("*")))
+                domain.robots = robots
+        return domain.robots.can_fetch("*", url)
+
+    async def fetch(self, domain, url, known=None):
+        # -> the 200 / 304 response, or None
+        headers = {"User-Agent": random.choice(USER_AGENTS)}
+        if known and known["content_hash"]:   # fetched successfully before
+            if known["etag"]:
+                headers["If-None-Match"] = known["etag"]
+            if known["last_modified"]:
+                headers["If-Modified-Since"] = known["last_modified"]
+        for attempt in range(self.max_retries + 1):
+            await domain.wait_turn()
+            try:
+                async with self.slots:
+                    res = await self.client.get(url, headers=headers)
+            except httpx.HTTPError as e:
+                error = str(e) or type(e).__name__
+            else:
+                if res.status_code in (200, 304):
+                    self.stats["bytes"] += len(res.content)
+                    return res
+                if res.status_code not in RETRY_STATUSES:
+                    print(f"⚠️ {res.status_code} {url}")
+                    return None
+                error = f"HTTP {res.status_code}"
+                # the whole domain slows down, not just this URL
+                retry_after = res.headers.get("Retry-After", "")
+                domain.back_off(float(retry_after) if retry_after.isdigit() else self.delay * 2 ** (attempt + 1))
+            if attempt < self.max_retries:
+                self.stats["retried"] += 1
+        print(f"⚠️ Giving up on {url}: {error}")
+        return None
+
+    async def worker(self, domain):
+        while True:
+            site, url, kind = await domain.queue.get()
+            try:
+                await self.process(domain, site, url, kind)
+            except Exception as e:
+                print(f"⚠️ {site.name}: failed on {url}: {e}")
+            finally:
+                self.done()
+
+    async def process(self, domain, site, url, kind):
+        if not await self.allowed(domain, url):
+            self.stats["robots_blocked"] += 1
+            self.mark(url, "blocked")
+            return
+        known = self.state.get(url) if self.state is not None else None
+        res = await self.fetch(domain, url, known)
+        if res is None:
+            self.stats["failed"] += 1
+            self.mark(url, "failed")
+            return
+        self.stats["fetched"] += 1
+        if res.status_code == 304:
+            self.stats["not_modified"] += 1
+            self.mark(url, "unchanged", 304)
+            links = known["links"]
+        else:
+            # BeautifulSoup is CPU bound; keep it off the event loop
+            records, links = await asyncio.to_thread(site.parse, url, kind, res.text)
+            digest = hashlib.sha256(json.dumps([[r.get("text") for r in records], links]).encode()).hexdigest()
+            changed = known is None or known["content_hash"] != digest
+            self.stats["changed" if changed else "unchanged"] += 1
+            if changed:
+                for record in records:
+                    self.write(site, record)
+            self.mark(url, "changed" if changed else "unchanged", 200, res.headers.get("ETag"),
+                      res.headers.get("Last-Modified"), digest, links)
+        for link, link_kind in links:
+            self.enqueue(site, link, link_kind)
+
+    def mark(self, url, status, *args):
+        if self.state is not None:
+            self.state.mark(url, status, *args)
+
+    # ---------- output ----------
+
+    def write(self, site, record):
+        if site.max_records is not None and self.records[site.name] >= site.max_records:
+            return
+        out = self.outputs.get(site.name)
+        if out is None:
+            out = self.outputs[site.name] = open(os.path.join(self.output_dir, f"{site.name}.jsonl"), "a", encoding="utf-8")
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        self.records[site.name] += 1
+        if self.records[site.name] % 50 == 0:
+            print(f"{site.name}: {self.records[site.name]} records")
+
+    async def run(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        start = time.perf_counter()
+        self.idle = asyncio.Event()
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.workers = []
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits, follow_redirects=True,
+                                     headers={"Accept-Language": "en-US,en;q=0.9"}) as self.client:
+            for site in self.sites:
+                for url, kind in site.start():
+                    self.enqueue(site, url, kind)
+                if self.state is not None:
+                    # whatever an interrupted run had discovered but not fetched
+                    for url, kind in self.state.queued(site.name):
+                        if url not in self.seen:
+                            self.stats["resumed"] += 1
+                            self.enqueue(site, url, kind)
+            if self.pending:
+                await self.idle.wait()
+            for task in self.workers:
+                task.cancel()
+            await asyncio.gather(*self.workers, return_exceptions=True)
+        for out in self.outputs.values():
+            out.close()
+        if self.state is not None:
+            self.state.close()
+        for site in self.sites:
+            print(f"{site.name} saved {self.records[site.name]} records → {os.path.join(self.output_dir, site.name + '.jsonl')}")
+        return {**self.stats, "records": dict(self.records), "domains": len(self.domains),
+                "seconds": round(time.perf_counter() - start, 1)}
+
+
+def crawl(sites, **options):
+    return asyncio.run(CrawlEngine(sites, **options).run())
+
+
+if __name__ == "__main__":
+    import argparse
+    from scraper_config import SCRAPE_CONFIG
+    parser = argparse.ArgumentParser(description="Crawl every site in sources.txt concurrently")
+    parser.add_argument("--sites", help="comma separated site names (default: all)")
+    parser.add_argument("--output-dir", default=RAW_DIR)
+    parser.add_argument("--concurrency", type=int, default=CRAWL_CONCURRENCY)
+    parser.add_argument("--per-domain", type=int, default=CRAWL_PER_DOMAIN)
+    parser.add_argument("--delay", type=float, default=CRAWL_DELAY)
+    parser.add_argument("--state-db", default=CRAWL_STATE_DB, help="crawl state to resume from and update")
+    parser.add_argument("--refresh-after", type=float, default=CRAWL_REFRESH_AFTER,
+                        help="seconds before an already fetched article is re-checked (0 = always)")
+    args = parser.parse_args()
+
+    wanted = set(args.sites.split(",")) if args.sites else None
+    sites = [ListingSite(cfg) for cfg in SCRAPE_CONFIG if wanted is None or cfg["name"] in wanted]
+    stats = crawl(sites, output_dir=args.output_dir, concurrency=args.concurrency,
+                  per_domain=args.per_domain, delay=args.delay, state=args.state_db,
+                  refresh_after=args.refresh_after)
+    print(json.dumps(stats, indent=2))
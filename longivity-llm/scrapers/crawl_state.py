@@ -0,0 +1,87 @@
+import json, os, sqlite3, time
+
+# Per-URL crawl state shared by every run of crawl_engine.py.
+#
+#   queued     discovered, not fetched yet (what a resumed run starts from)
+#   changed    fetched and its extracted content differed from the last run
+#   unchanged  304, or 200 with the same content hash
+#   failed     gave up after retries; validators from the last good fetch are kept
+#   blocked    disallowed by robots.txt
+#
+# etag / last_modified are sent back as If-None-Match / If-Modified-Since, and
+# the links a page produced are stored so a 304 listing page still leads on
+# to its articles and next page.
+DONE = ("changed", "unchanged")
+
+
+class CrawlState:
+    def __init__(self, path, commit_every=50):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS urls (
+            url TEXT PRIMARY KEY, site TEXT, kind TEXT, status TEXT, http_status INTEGER,
+            etag TEXT, last_modified TEXT, content_hash TEXT, links TEXT,
+            fetched_at REAL, changed_at REAL)""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS urls_site_status ON urls (site, status)")
+        self.conn.commit()
+        self.commit_every = commit_every
+        self.writes = 0
+
+    def get(self, url):
+        row = self.conn.execute("SELECT status, etag, last_modified, content_hash, links, fetched_at FROM urls WHERE url = ?",
+                                (url,)).fetchone()
+        if row is None:
+            return None
+        return {"status": row[0], "etag": row[1], "last_modified": row[2], "content_hash": row[3],
+                "links": json.loads(row[4]) if row[4] else [], "fetched_at": row[5] or 0}
+
+    def queued(self, site):
+        return self.conn.execute("SELECT url, kind FROM urls WHERE site = ? AND status = 'queued'", (site,)).fetchall()
+
+    def queue(self, url, site, kind):
+        self.conn.execute("""INSERT INTO urls (url, site, kind, status) VALUES (?, ?, ?, 'queued')
+                             ON CONFLICT(url) DO UPDATE SET status = 'queued'""", (url, site, kind))
+        self._wrote()
+
+    def mark(self, url, status, http_status=None, etag=None, last_modified=None, content_hash=None, links=None):
+        # validators and links are only replaced when a new value came with this fetch
+        now = time.time()
+        self.conn.execute("""UPDATE urls SET status = ?, http_status = ?,
+                                 etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified),
+                                 content_hash = COALESCE(?, content_hash), links = COALESCE(?, links),
+                                 fetched_at = CASE WHEN ? IN ('changed', 'unchanged') THEN ? ELSE fetched_at END,
+                                 changed_at = CASE WHEN ? = 'changed' THEN ? ELSE changed_at END
+                             WHERE url = ?""",
+                          (status, http_status, etag, last_modified, content_hash,
+                           None if links is None else json.dumps(links), status, now, status, now, url))
+        self._wrote()
+
+    def _wrote(self):
+        self.writes += 1
+        if self.writes % self.commit_every == 0:
+            self.conn.commit()
+
+    def counts(self, site=None):
+        query = "SELECT status, COUNT(*) FROM urls" + (" WHERE site = ?" if site else "") + " GROUP BY status"
+        return dict(self.conn.execute(query, (site,) if site else ()).fetchall())
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    from scraper_config import CRAWL_STATE_DB
+    parser = argparse.ArgumentParser(description="Show or reset crawl state")
+    parser.add_argument("--db", default=CRAWL_STATE_DB)
+    parser.add_argument("--site", help="limit to one site")
+    parser.add_argument("--forget", action="store_true", help="drop the site's rows so it is crawled from scratch")
+    args = parser.parse_args()
+
+    state = CrawlState(args.db)
+    if args.forget:
+        state.conn.execute("DELETE FROM urls" + (" WHERE site = ?" if args.site else ""), (args.site,) if args.site else ())
+    print(json.dumps(state.counts(args.site), indent=2))
+    state.close()
@@ -1,82 +1,224 @@
 # scrapers/pubmed_fetcher.py
-import requests
+import asyncio
 import time
 import json
 import os
+import sqlite3
+import httpx
+from xml.etree import ElementTree as ET
 
 # Config
 SEARCH_TERMS = ["longevity", "anti-aging", "healthy aging", "supplement longevity", "biological age"]
 MAX_RESULTS = 5000  # per term (use high value to hit goal)
 ENTREZ_BASE = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
 OUTPUT_PATH = "../data/raw/pubmed.jsonl"
+SEEN_DB = "../data/pubmed_seen.db"
 EMAIL = "your-email@example.com"  # replace with real email (required by NCBI)
+API_KEY = os.getenv("NCBI_API_KEY", "")
+# NCBI allows 3 requests/s per IP, 10/s with an API key
+RATE = 10 if API_KEY else 3
+FETCH_BATCH = 200      # records per efetch
+ID_PAGE = 10000        # ids per esearch page / epost
 
 os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
 
 headers = {"User-Agent": f"pubmed-fetcher (mailto:{EMAIL})"}
 
-def search_pubmed(term, retmax=MAX_RESULTS):
-    url = f"{ENTREZ_BASE}/esearch.fcgi"
-    params = {
-        "db": "pubmed",
-        "term": term,
-        "retmode": "json",
-        "retmax": retmax
-    }
-    r = requests.get(url, params=params, headers=headers)
-    r.raise_for_status()
-    return r.json()["esearchresult"]["idlist"]
-
-def fetch_details(pmids):
-    url = f"{ENTREZ_BASE}/efetch.fcgi"
-    params = {
-        "db": "pubmed",
-        "retmode": "xml",
-        "id": ",".join(pmids)
+# Each term is searched with usehistory and its ids paged from esearch; ids not
+# already in SEEN_DB are epost-ed back to the history server, and efetch pages
+# through them by WebEnv/query_key. efetch calls for all terms run concurrently,
+# started no faster than RATE per second, and each response is parsed while it
+# streams in, so memory stays flat. A PMID is added to SEEN_DB once its record
+# has been written, so a failed batch is simply retried on the next run.
+
+
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            wait = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class SeenPmids:
+    def __init__(self, path, output_path=OUTPUT_PATH):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS pmids (pmid TEXT PRIMARY KEY)")
+        if self.conn.execute("SELECT COUNT(*) FROM pmids").fetchone()[0] == 0 and os.path.exists(output_path):
+            # first run with a state file: start from what earlier runs already wrote
+            with open(output_path, encoding="utf-8") as f:
+                self.add(json.loads(line)["pmid"] for line in f if line.strip())
+        self.conn.commit()
+
+    def new(self, pmids):
+        seen = set()
+        for i in range(0, len(pmids), 500):
+            chunk = pmids[i:i + 500]
+            query = f"SELECT pmid FROM pmids WHERE pmid IN ({','.join('?' * len(chunk))})"
+            seen.update(row[0] for row in self.conn.execute(query, chunk))
+        return [pmid for pmid in pmids if pmid not in seen]
+
+    def add(self, pmids):
+        self.conn.executemany("INSERT OR IGNORE INTO pmids (pmid) VALUES (?)", ((pmid,) for pmid in pmids))
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def text_of(elem):
+    return " ".join("".join(elem.itertext()).split()) if elem is not None else ""
+
+
+def parse_article(article):
+    pmid = article.findtext("MedlineCitation/PMID")
+    title = text_of(article.find(".//ArticleTitle"))
+    abstract = " ".join(text_of(abst) for abst in article.findall(".//AbstractText"))
+    authors = [au.findtext("LastName") for au in article.findall(".//Author") if au.findtext("LastName")]
+    return {
+        "pmid": pmid,
+        "title": title,
+        "abstract": abstract,
+        "authors": authors,
+        "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
     }
-    r = requests.get(url, params=params, headers=headers)
-    r.raise_for_status()
-    return r.text
 
-from xml.etree import ElementTree as ET
 
-def parse_xml(xml):
-    root = ET.fromstring(xml)
-    results = []
-    for article in root.findall(".//PubmedArticle"):
+class PubMedFetcher:
+    def __init__(self, terms=SEARCH_TERMS, output_path=OUTPUT_PATH, seen_db=SEEN_DB, rate=RATE,
+                 max_results=MAX_RESULTS, batch_size=FETCH_BATCH, base=ENTREZ_BASE, max_retries=3):
+        self.terms = terms
+        self.output_path = output_path
+        self.seen = SeenPmids(seen_db, output_path)
+        self.limiter = RateLimiter(rate)
+        self.concurrency = rate
+        self.max_results = max_results
+        self.batch_size = batch_size
+        self.base = base
+        self.max_retries = max_retries
+        self.stats = {"requests": 0, "retried": 0, "found": 0, "new": 0, "written": 0, "batches": 0, "failed_batches": 0}
+
+    async def request(self, method, endpoint, params, stream=False):
+        params = {"db": "pubmed", "tool": "pubmed-fetcher", "email": EMAIL, **params}
+        if API_KEY:
+            params["api_key"] = API_KEY
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.wait()
+            self.stats["requests"] += 1
+            # ids and WebEnv go in the body of a POST, which has no length limit
+            args = {"data": params} if method == "POST" else {"params": params}
+            request = self.client.build_request(method, f"{self.base}/{endpoint}", **args)
+            try:
+                res = await self.client.send(request, stream=stream)
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if res.status_code == 200:
+                    return res
+                await res.aclose()
+                if (res.status_code != 429 and res.status_code < 500) or attempt == self.max_retries:
+                    res.raise_for_status()
+            self.stats["retried"] += 1
+            await asyncio.sleep(2 ** attempt)
+
+    async def search(self, term):
+        # -> ids for the term, paged through the history server
+        res = await self.request("GET", "esearch.fcgi", {"term": term, "usehistory": "y", "retmode": "json", "retmax": 0})
+        result = res.json()["esearchresult"]
+        count = min(int(result["count"]), self.max_results)
+        pmids = []
+        for start in range(0, count, ID_PAGE):
+            res = await self.request("GET", "esearch.fcgi", {"WebEnv": result["webenv"], "query_key": result["querykey"],
+                                                             "retstart": start, "retmax": min(ID_PAGE, count - start),
+                                                             "retmode": "json"})
+            pmids += res.json()["esearchresult"]["idlist"]
+        return pmids
+
+    async def post(self, pmids):
+        # -> (WebEnv, query_key) holding these ids on the history server
+        res = await self.request("POST", "epost.fcgi", {"id": ",".join(pmids)})
+        root = ET.fromstring(res.content)
+        return root.findtext("WebEnv"), root.findtext("QueryKey")
+
+    async def fetch(self, webenv, query_key, start, count):
+        res = await self.request("POST", "efetch.fcgi", {"WebEnv": webenv, "query_key": query_key, "retstart": start,
+                                                         "retmax": count, "retmode": "xml"}, stream=True)
+        # incremental iterparse: articles are handled as their closing tag arrives
+        parser = ET.XMLPullParser(events=("start", "end"))
+        root = None
+        pmids = []
         try:
-            pmid = article.findtext(".//PMID")
-            title = article.findtext(".//ArticleTitle")
-            abstract = " ".join([abst.text.strip() for abst in article.findall(".//AbstractText") if abst.text])
-            authors = [au.findtext("LastName") for au in article.findall(".//Author") if au.findtext("LastName")]
-            results.append({
-                "pmid": pmid,
-                "title": title,
-                "abstract": abstract,
-                "authors": authors,
-                "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
-            })
-        except:
-            continue
-    return results
+            async for chunk in res.aiter_bytes():
+                parser.feed(chunk)
+                for event, elem in parser.read_events():
+                    if root is None:
+                        root = elem
+                    if event == "end" and elem.tag == "PubmedArticle":
+                        record = parse_article(elem)
+                        self.out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        pmids.append(record["pmid"])
+                        root.clear()
+            parser.close()
+        finally:
+            # whatever was written before a failure counts as seen
+            await res.aclose()
+            self.out.flush()
+            self.seen.add(pmids)
+            self.seen.commit()
+            self.stats["written"] += len(pmids)
+        self.stats["batches"] += 1
+        if self.stats["batches"] % 10 == 0:
+            print(f"{self.stats['written']} articles written")
+
+    async def fetch_batch(self, slots, job):
+        async with slots:
+            try:
+                await self.fetch(*job)
+            except Exception as e:
+                self.stats["failed_batches"] += 1
+                print(f"⚠️ efetch {job[2]}-{job[2] + job[3]} failed: {e}")
+
+    async def run(self):
+        start = time.perf_counter()
+        claimed = set()
+        jobs = []
+        async with httpx.AsyncClient(timeout=60, headers=headers) as self.client:
+            for term in self.terms:
+                print(f"Searching for '{term}'...")
+                pmids = await self.search(term)
+                new = [pmid for pmid in self.seen.new(pmids) if pmid not in claimed]
+                claimed.update(new)
+                self.stats["found"] += len(pmids)
+                self.stats["new"] += len(new)
+                print(f"Found {len(pmids)} articles for term '{term}', {len(new)} new")
+                for i in range(0, len(new), ID_PAGE):
+                    chunk = new[i:i + ID_PAGE]
+                    webenv, query_key = await self.post(chunk)
+                    jobs += [(webenv, query_key, s, min(self.batch_size, len(chunk) - s))
+                             for s in range(0, len(chunk), self.batch_size)]
+            slots = asyncio.Semaphore(self.concurrency)
+            with open(self.output_path, "a", encoding="utf-8") as self.out:
+                await asyncio.gather(*(self.fetch_batch(slots, job) for job in jobs))
+        self.seen.close()
+        self.stats["seconds"] = round(time.perf_counter() - start, 1)
+        return self.stats
+
 
 def run():
-    seen_pmids = set()
-    with open(OUTPUT_PATH, "w", encoding="utf-8") as out:
-        for term in SEARCH_TERMS:
-            print(f"Searching for '{term}'...")
-            pmids = search_pubmed(term)
-            print(f"Found {len(pmids)} articles for term '{term}'")
-            for i in range(0, len(pmids), 200):
-                chunk = pmids[i:i+200]
-                xml = fetch_details(chunk)
-                parsed = parse_xml(xml)
-                for record in parsed:
-                    if record["pmid"] not in seen_pmids:
-                        out.write(json.dumps(record, ensure_ascii=False) + "\n")
-                        seen_pmids.add(record["pmid"])
-                time.sleep(1.0)  # rate limit
-    print(f"✅ Saved {len(seen_pmids)} articles → {OUTPUT_PATH}")
+    stats = asyncio.run(PubMedFetcher().run())
+    print(json.dumps(stats, indent=2))
+    print(f"✅ Saved {stats['written']} new articles → {OUTPUT_PATH}")
 
 if __name__ == "__main__":
     run()
@@ -1,11 +1,27 @@
-import requests, os, time, json
+import requests, os, time, json, re, hashlib, asyncio
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+import httpx
+from scraper_config import USER_AGENTS, RAW_DIR
 
 API_KEY = ""  # Optional: add your Semantic Scholar API key here
 SEARCH_TERMS = ["supplements", "micronutrients", "longevity", "anti-aging", "nutraceuticals"]
 SAVE_DIR = "../data/semantic_pdfs"
+OUTPUT_PATH = os.path.join(RAW_DIR, "semantic_scholar.jsonl")
 MAX_RESULTS = 5000
 PER_PAGE = 100
 
+# Papers are downloaded by DOWNLOAD_WORKERS tasks sharing one connection pool
+# (at most PER_HOST_DOWNLOADS against any single host) and streamed to disk.
+# Each finished PDF goes to a pool of EXTRACT_PROCESSES that turns it into
+# cleaned text; records are appended to OUTPUT_PATH, skipping paper ids and
+# texts that are already there, so the whole thing can simply be re-run.
+DOWNLOAD_WORKERS = int(os.getenv("PDF_DOWNLOAD_WORKERS", "16"))
+PER_HOST_DOWNLOADS = int(os.getenv("PDF_PER_HOST", "4"))
+EXTRACT_PROCESSES = int(os.getenv("PDF_EXTRACT_PROCESSES", str(os.cpu_count() or 2)))
+MAX_PDF_BYTES = 50 * 1024 * 1024
+MIN_TEXT_CHARS = 2000
+
 os.makedirs(SAVE_DIR, exist_ok=True)
 HEADERS = {"x-api-key": API_KEY} if API_KEY else {}
 
@@ -42,39 +58,188 @@ def fetch_papers(term):
             break
     return all_papers
 
-def download_pdf(paper):
-    pdf_info = paper.get("openAccessPdf")
-    if not pdf_info:
-        return False
-        
-    url = pdf_info.get("url")
-    if not url or not url.endswith(".pdf"):
-        return False
-    paper_id = paper.get("paperId") or paper.get("url", "").split("/")[-1]
-    filename = os.path.join(SAVE_DIR, f"{paper_id}.pdf")
-    if os.path.exists(filename):
-        return True
+def paper_id(paper):
+    return paper.get("paperId") or paper.get("url", "").split("/")[-1]
+
+def pdf_url(paper):
+    url = (paper.get("openAccessPdf") or {}).get("url")
+    return url if url and url.endswith(".pdf") else None
+
+# ---------- text extraction (runs in worker processes) ----------
+
+HYPHENATED = re.compile(r"(\w)-\n(\w)")
+PAGE_NUMBER = re.compile(r"^\s*(page\s*)?\d{1,4}(\s*(of|/)\s*\d{1,4})?\s*$", re.I)
+REFERENCES = re.compile(r"^(\d+\.?\s*)?(references|bibliography|literature cited)$", re.I)
+
+def clean_text(text):
+    text = text.replace("\x00", "").replace("\u00ad", "")
+    text = HYPHENATED.sub(r"\1\2", text)
+    lines = [line.strip() for line in text.splitlines() if not PAGE_NUMBER.match(line)]
+    # the reference list is mostly citations, not content
+    cut = [i for i, line in enumerate(lines) if REFERENCES.match(line) and i > len(lines) * 0.5]
+    if cut:
+        lines = lines[:cut[-1]]
+    # PDF lines are layout breaks; keep blank lines as paragraph breaks
+    text = "\n".join(lines)
+    text = re.sub(r"(?<!\n)\n(?!\n)", " ", text)
+    text = re.sub(r"[ \t]+", " ", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+def extract_text(path):
+    from pypdf import PdfReader
     try:
-        r = requests.get(url, timeout=15)
-        if r.ok and b"%PDF" in r.content[:5]:
-            with open(filename, "wb") as f:
-                f.write(r.content)
-            print(f"Saved: {filename}")
-            return True
-    except Exception:
-        pass
-    return False
+        reader = PdfReader(path)
+        return clean_text("\n".join(page.extract_text() or "" for page in reader.pages))
+    except Exception as e:
+        print(f"⚠️ Could not read {path}: {e}")
+        return ""
+
+def content_hash(text):
+    return hashlib.sha256(" ".join(text.lower().split()).encode()).hexdigest()
+
+# ---------- pipeline ----------
+
+def load_seen(path):
+    ids, hashes = set(), set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                ids.add(record.get("paper_id"))
+                hashes.add(record.get("content_hash"))
+    return ids, hashes
+
+class PdfPipeline:
+    def __init__(self, output_path=OUTPUT_PATH, save_dir=SAVE_DIR, workers=DOWNLOAD_WORKERS,
+                 per_host=PER_HOST_DOWNLOADS, processes=EXTRACT_PROCESSES):
+        self.output_path = output_path
+        self.save_dir = save_dir
+        self.workers = workers
+        self.per_host = per_host
+        self.processes = processes
+        self.hosts = {}
+        self.extracting = set()
+        self.seen_ids, self.seen_hashes = load_seen(output_path)
+        self.stats = {"queued": 0, "downloaded": 0, "cached": 0, "download_failed": 0, "bytes": 0,
+                      "extracted": 0, "too_short": 0, "duplicate_id": 0, "duplicate_text": 0}
+
+    async def download(self, url, filename):
+        host = self.hosts.setdefault(urlparse(url).netloc, asyncio.Semaphore(self.per_host))
+        part = filename + ".part"
+        try:
+            async with host:
+                async with self.client.stream("GET", url, headers={"User-Agent": USER_AGENTS[0]}) as r:
+                    if r.status_code != 200:
+                        return False
+                    size = 0
+                    with open(part, "wb") as f:
+                        async for chunk in r.aiter_bytes(64 * 1024):
+                            if size == 0 and not chunk.lstrip().startswith(b"%PDF"):
+                                break
+                            size += len(chunk)
+                            if size > MAX_PDF_BYTES:
+                                break
+                            f.write(chunk)
+                        else:
+                            if size:
+                                os.replace(part, filename)
+                                self.stats["bytes"] += size
+                                return True
+            return False
+        finally:
+            # a rejected body or a stream dropped halfway leaves no partial file behind
+            if os.path.exists(part):
+                os.remove(part)
+
+    async def worker(self, queue):
+        while True:
+            paper = await queue.get()
+            try:
+                await self.handle(paper)
+            except Exception as e:
+                self.stats["download_failed"] += 1
+                print(f"⚠️ {paper_id(paper)}: {type(e).__name__} {e}")
+            finally:
+                queue.task_done()
+
+    async def handle(self, paper):
+        pid = paper_id(paper)
+        filename = os.path.join(self.save_dir, f"{pid}.pdf")
+        if os.path.exists(filename):
+            self.stats["cached"] += 1
+        elif await self.download(pdf_url(paper), filename):
+            self.stats["downloaded"] += 1
+        else:
+            self.stats["download_failed"] += 1
+            return
+        # parsing happens in the process pool while this worker moves on to the next download
+        task = asyncio.create_task(self.extract(paper, filename))
+        self.extracting.add(task)
+        task.add_done_callback(self.extracting.discard)
+
+    async def extract(self, paper, filename):
+        text = await asyncio.get_running_loop().run_in_executor(self.pool, extract_text, filename)
+        self.stats["extracted"] += 1
+        self.write(paper, text)
+
+    def write(self, paper, text):
+        pid = paper_id(paper)
+        if len(text) < MIN_TEXT_CHARS:
+            self.stats["too_short"] += 1
+            return
+        digest = content_hash(text)
+        # the same paper often turns up under several ids (preprint, journal, mirror)
+        if digest in self.seen_hashes or pid in self.seen_ids:
+            self.stats["duplicate_text" if digest in self.seen_hashes else "duplicate_id"] += 1
+            return
+        self.seen_ids.add(pid)
+        self.seen_hashes.add(digest)
+        record = {"source": "semantic_scholar", "paper_id": pid, "url": paper.get("url") or pdf_url(paper),
+                  "title": paper.get("title", ""), "year": paper.get("year"), "content_hash": digest, "text": text}
+        self.out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.out.flush()
+        if self.stats["extracted"] % 100 == 0:
+            print(f"{self.stats['extracted']} papers extracted")
+
+    async def run(self, papers):
+        start = time.perf_counter()
+        os.makedirs(os.path.dirname(self.output_path) or ".", exist_ok=True)
+        queue = asyncio.Queue(maxsize=self.workers * 2)
+        limits = httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers)
+        with ProcessPoolExecutor(self.processes) as self.pool, open(self.output_path, "a", encoding="utf-8") as self.out:
+            async with httpx.AsyncClient(timeout=httpx.Timeout(30, connect=15), limits=limits, follow_redirects=True) as self.client:
+                tasks = [asyncio.create_task(self.worker(queue)) for _ in range(self.workers)]
+                for paper in papers:
+                    if paper_id(paper) in self.seen_ids:
+                        self.stats["duplicate_id"] += 1
+                        continue
+                    if pdf_url(paper):
+                        self.stats["queued"] += 1
+                        await queue.put(paper)
+                await queue.join()
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, *self.extracting, return_exceptions=True)
+        self.stats["seconds"] = round(time.perf_counter() - start, 1)
+        return self.stats
+
+def unique_papers(terms):
+    # overlapping search terms return many of the same papers
+    papers = {}
+    for term in terms:
+        for paper in fetch_papers(term):
+            papers.setdefault(paper_id(paper), paper)
+    return list(papers.values())
 
 if __name__ == "__main__":
-    all_downloaded = []
-    for term in SEARCH_TERMS:
-        papers = fetch_papers(term)
-        for paper in papers:
-            if download_pdf(paper):
-                all_downloaded.append(paper)
-            time.sleep(0.5)
-        print(f"Done term: {term}, total downloaded so far: {len(all_downloaded)}")
+    papers = unique_papers(SEARCH_TERMS)
+    print(f"{len(papers)} unique papers, {sum(1 for p in papers if pdf_url(p))} with an open access PDF")
     # Save metadata
     with open("semantic_metadata.json", "w", encoding="utf-8") as f:
-        json.dump(all_downloaded, f, ensure_ascii=False, indent=2)
-    print(f" Finished. {len(all_downloaded)} PDFs downloaded.")
+        json.dump(papers, f, ensure_ascii=False, indent=2)
+    stats = asyncio.run(PdfPipeline().run(papers))
+    print(json.dumps(stats, indent=2))
+    print(f" Finished. Text appended to {OUTPUT_PATH}")
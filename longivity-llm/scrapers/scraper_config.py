@@ -11,3 +11,17 @@ USER_AGENTS = [
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.3 Safari/605.1.15",
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
 ]
+
+# crawl_engine.py: total open requests, requests in flight per domain, and the
+# minimum gap between two requests to the same domain (robots.txt Crawl-delay wins if longer)
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "16"))
+CRAWL_PER_DOMAIN = int(os.getenv("CRAWL_PER_DOMAIN", "2"))
+CRAWL_DELAY = float(os.getenv("CRAWL_DELAY", "1.0"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "15"))
+RAW_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "raw"))
+
+# crawl_state.py: per-URL status and validators, so re-runs resume and only
+# fetch what changed. Articles fetched within CRAWL_REFRESH_AFTER seconds are not
+# requested again; listing pages are always re-checked with a conditional GET.
+CRAWL_STATE_DB = os.getenv("CRAWL_STATE_DB", os.path.join(os.path.dirname(RAW_DIR), "crawl_state.db"))
+CRAWL_REFRESH_AFTER = float(os.getenv("CRAWL_REFRESH_AFTER", str(7 * 24 * 3600)))
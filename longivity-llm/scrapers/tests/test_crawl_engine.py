@@ -0,0 +1,101 @@
+import asyncio, json, os, threading, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from bench_crawl import fixture_site
+from crawl_engine import CrawlEngine, ListingSite, PageListSite, crawl
+
+
+def site_config(server):
+    return {"name": "fixture", "base_url": f"http://127.0.0.1:{server.server_port}", "start_page": "/blog/1",
+            "article_selector": ".entry-content", "article_link_selector": "h2.entry-title a",
+            "next_selector": ".next.page-numbers"}
+
+
+def records(output_dir):
+    with open(os.path.join(output_dir, "fixture.jsonl"), encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def server():
+    server = fixture_site(pages=2, per_page=3, latency=0)
+    yield server
+    server.shutdown()
+
+
+def test_recrawl_only_appends_changed_articles(server, tmp_path):
+    options = {"output_dir": str(tmp_path), "state": str(tmp_path / "state.db"), "delay": 0}
+    first = crawl([ListingSite(site_config(server))], **options)
+    assert first["records"] == {"fixture": 6}
+
+    server.edited.add("/post/1-0")
+    again = crawl([ListingSite(site_config(server))], refresh_after=0, **options)
+    # 2 listing pages and 5 articles answer 304, the edited one comes back in full
+    assert again["fetched"] == 8
+    assert again["not_modified"] == 7
+    assert again["records"] == {"fixture": 1}
+    assert len(records(tmp_path)) == 7
+
+
+def test_recently_fetched_articles_are_not_requested(server, tmp_path):
+    options = {"output_dir": str(tmp_path), "state": str(tmp_path / "state.db"), "delay": 0}
+    crawl([ListingSite(site_config(server))], **options)
+    again = crawl([ListingSite(site_config(server))], **options)
+    assert again["skipped_fresh"] == 6
+    assert again["fetched"] == 2   # just the listing pages, conditionally
+    assert again["records"] == {"fixture": 0}
+
+
+def test_interrupted_crawl_resumes_without_duplicates(tmp_path):
+    server = fixture_site(pages=3, per_page=10, latency=0.05)
+    options = {"output_dir": str(tmp_path), "state": str(tmp_path / "state.db"), "delay": 0.05}
+
+    async def interrupted():
+        engine = CrawlEngine([ListingSite(site_config(server))], **options)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(engine.run(), 0.8)
+        engine.state.close()
+
+    try:
+        asyncio.run(interrupted())
+        written = len(records(tmp_path))
+        assert 0 < written < 30
+        resumed = crawl([ListingSite(site_config(server))], **options)
+    finally:
+        server.shutdown()
+    assert resumed["resumed"] > 0
+    urls = [record["url"] for record in records(tmp_path)]
+    assert len(urls) == len(set(urls)) == 30
+
+
+def test_429_is_retried_after_retry_after(tmp_path):
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            hits.append(time.monotonic())
+            if len(hits) == 1:
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = b"<html><body><p>protein and sleep</p></body></html>"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        stats = crawl([PageListSite("page", [f"http://127.0.0.1:{server.server_port}/page"])],
+                      output_dir=str(tmp_path), state=None, delay=0, respect_robots=False)
+    finally:
+        server.shutdown()
+    assert stats["retried"] == 1
+    assert stats["records"] == {"page": 1}
+    assert hits[1] - hits[0] >= 1